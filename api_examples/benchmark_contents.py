@@ -0,0 +1,58 @@
+"""
+Compare requests/sec on the course contents endpoint when
+authenticating with HTTP Basic (password hash per request) and
+with a signed token (one HMAC check per request).
+
+    python api_examples/benchmark_contents.py --course 1 -n 500 -c 8
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from dotenv import load_dotenv
+
+load_dotenv()
+
+username = os.getenv("API_USERNAME")
+password = os.getenv("API_PASSWORD")
+
+
+def run(url, total, concurrency, **kwargs):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=concurrency)
+    session.mount('http://', adapter)
+
+    def call(_):
+        return session.get(url, **kwargs).status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        statuses = list(executor.map(call, range(total)))
+    elapsed = time.perf_counter() - start
+    errors = sum(1 for status in statuses if status != 200)
+    return total / elapsed, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000/api/')
+    parser.add_argument('--course', type=int, required=True)
+    parser.add_argument('-n', '--requests', type=int, default=200)
+    parser.add_argument('-c', '--concurrency', type=int, default=4)
+    args = parser.parse_args()
+
+    url = f'{args.base_url}courses/{args.course}/contents/'
+    r = requests.post(f'{args.base_url}token/', auth=(username, password))
+    r.raise_for_status()
+    token = r.json()['token']
+
+    for name, kwargs in (
+            ('basic', {'auth': (username, password)}),
+            ('token', {'headers': {'Authorization': f'Token {token}'}})):
+        rate, errors = run(url, args.requests, args.concurrency, **kwargs)
+        print(f'{name:>6}: {rate:8.1f} requests/sec ({errors} errors)')
+
+
+if __name__ == '__main__':
+    main()
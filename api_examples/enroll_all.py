@@ -8,18 +8,25 @@ username = os.getenv("API_USERNAME")
 password = os.getenv("API_PASSWORD")
 base_url = 'http://127.0.0.1:8000/api/'
 
-# retrieve all courses
-r = requests.get(f'{base_url}courses/')
-courses = r.json()
+# retrieve all courses, page by page, with only the fields needed
+courses = []
+url = f'{base_url}courses/?fields=id,title&page_size=100'
+while url:
+    r = requests.get(url)
+    page = r.json()
+    courses.extend(page['results'])
+    url = page['next']
 
 available_courses = ', '.join([course['title'] for course in courses])
 print(f'Available courses: {available_courses}')
 
-for course in courses:
-    course_id = course['id']
-    course_title = course['title']
-    r = requests.post(f'{base_url}courses/{course_id}/enroll/',
-                      auth=(username, password))
-    if r.status_code == 200:
-        # successful request
-        print(f'Successfully enrolled in {course_title}')
+# enroll in all courses with a single request
+titles = {course['id']: course['title'] for course in courses}
+r = requests.post(f'{base_url}courses/enroll/',
+                  json={'courses': list(titles)},
+                  auth=(username, password))
+if r.status_code == 200:
+    # successful request
+    for result in r.json()['results']:
+        if result['enrolled']:
+            print(f'Successfully enrolled in {titles[result["course"]]}')
@@ -0,0 +1,49 @@
+import hashlib
+import os
+import sys
+import requests
+from dotenv import load_dotenv
+
+load_dotenv()
+
+username = os.getenv("API_USERNAME")
+password = os.getenv("API_PASSWORD")
+base_url = 'http://127.0.0.1:8000/api/'
+
+# usage: upload_file.py <path> [module id]
+path = sys.argv[1]
+module_id = sys.argv[2] if len(sys.argv) > 2 else None
+size = os.path.getsize(path)
+digest = hashlib.sha256()
+with open(path, 'rb') as f:
+    for data in iter(lambda: f.read(1024 * 1024), b''):
+        digest.update(data)
+
+session = requests.Session()
+session.auth = (username, password)
+r = session.post(f'{base_url}uploads/',
+                 json={'model': 'file', 'filename': os.path.basename(path),
+                       'size': size, 'sha256': digest.hexdigest()})
+r.raise_for_status()
+upload = r.json()
+url = f'{base_url}uploads/{upload["id"]}/'
+
+with open(path, 'rb') as f:
+    offset = upload['offset']
+    while offset < size:
+        f.seek(offset)
+        chunk = f.read(upload['chunk_size'])
+        last = offset + len(chunk) - 1
+        try:
+            r = session.put(url, data=chunk, headers={
+                'Content-Range': f'bytes {offset}-{last}/{size}',
+                'Content-Type': 'application/octet-stream'})
+            offset = r.json()['offset']
+        except requests.ConnectionError:
+            # resume from what the server received
+            offset = session.get(url).json()['offset']
+        print(f'{offset}/{size} bytes')
+
+r = session.post(f'{url}complete/',
+                 json={'title': os.path.basename(path), 'module': module_id})
+print(r.json())
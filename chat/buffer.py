@@ -0,0 +1,76 @@
+"""
+Write-behind buffer for chat messages.
+
+Consumers hand unsaved messages to the buffer, which stores them with
+one ``bulk_create`` per batch: when ``max_size`` messages are waiting,
+or ``interval`` seconds after the first message of a batch. The event
+loop never waits on a per-message insert.
+
+Consumers close the buffer whenever the last socket of a room in the
+process disconnects, which also happens when the server shuts down
+gracefully. A worker killed outright loses up to ``interval`` seconds
+of messages.
+"""
+import asyncio
+import logging
+from channels.db import database_sync_to_async
+from django.conf import settings
+from .models import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+
+class MessageBuffer:
+
+    def __init__(self, max_size=100, interval=1.0):
+        self.max_size = max_size
+        self.interval = interval
+        self.messages = []
+        self._timer = None
+        self._tasks = set()
+
+    def _spawn(self, coroutine):
+        task = asyncio.get_running_loop().create_task(coroutine)
+        # keep a reference until the task is done
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def add(self, message):
+        self.messages.append(message)
+        if len(self.messages) >= self.max_size:
+            self._spawn(self.flush())
+        elif self._timer is None:
+            self._timer = self._spawn(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.interval)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self):
+        batch, self.messages = self.messages, []
+        if not batch:
+            return
+        try:
+            await database_sync_to_async(
+                ChatMessage.objects.bulk_create)(batch)
+        except Exception:
+            logger.exception('Could not store %d chat messages', len(batch))
+
+    async def close(self):
+        """
+        Store the pending messages and wait for running flushes.
+        The buffer can be used again afterwards.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+message_buffer = MessageBuffer(
+    max_size=getattr(settings, 'CHAT_BUFFER_SIZE', 100),
+    interval=getattr(settings, 'CHAT_BUFFER_INTERVAL', 1.0))
@@ -1,7 +1,15 @@
+import asyncio
 import json
+from collections import Counter
 from channels.generic.websocket import AsyncWebsocketConsumer
 from asgiref.sync import async_to_sync
+from django.conf import settings
 from django.utils import timezone
+from courses.membership import ais_enrolled
+from . import history, presence
+from .buffer import message_buffer
+from .models import ChatMessage
+from .throttling import RedisTokenBucket, TokenBucket, metrics
 
 
 class ChatConsumer(AsyncWebsocketConsumer):
@@ -9,12 +17,102 @@ class ChatConsumer(AsyncWebsocketConsumer):
     Inherits from the Channels WebsocketConsumer class
     to implement a basic WebSocket consumer.
     """
+    max_connections_per_user = getattr(
+        settings, 'CHAT_MAX_CONNECTIONS_PER_USER', 5)
+    max_connections_per_room = getattr(
+        settings, 'CHAT_MAX_CONNECTIONS_PER_ROOM', 1000)
+    # buffer outgoing messages for this many seconds and send them
+    # as a single JSON array frame; 0 sends one frame per message
+    coalesce_delay = getattr(settings, 'CHAT_COALESCE_MS', 0) / 1000
+    # store messages in the room history and the database
+    persist = getattr(settings, 'CHAT_PERSIST', True)
+    # keep the room's online users in Redis
+    track_presence = getattr(settings, 'CHAT_TRACK_PRESENCE', True)
+    # largest accepted frame, in characters
+    max_message_size = getattr(settings, 'CHAT_MAX_MESSAGE_SIZE', 4096)
+    # (messages per second, burst) accepted per connection and per room;
+    # None disables the limit
+    connection_rate = getattr(settings, 'CHAT_CONNECTION_RATE', (1, 5))
+    room_rate = getattr(settings, 'CHAT_ROOM_RATE', (20, 50))
+    # share room buckets between workers through Redis
+    shared_throttle = getattr(settings, 'CHAT_THROTTLE_SHARED', False)
+    # 'drop' the throttled message or 'close' the connection
+    throttle_action = getattr(settings, 'CHAT_THROTTLE_ACTION', 'drop')
+    room_buckets = {}
+    # open connections in this process
+    user_connections = Counter()
+    room_connections = Counter()
+
+    async def authorize(self):
+        """
+        Only students of the course can join its room;
+        the check uses the cached enrollments.
+        """
+        return (self.user.is_authenticated
+                and await ais_enrolled(self.user, self.id))
+
+    def acquire_slot(self):
+        """
+        Count the connection against the per-user and per-room caps.
+        """
+        if (self.user_connections[self.user.pk]
+                >= self.max_connections_per_user
+                or self.room_connections[self.id]
+                >= self.max_connections_per_room):
+            return False
+        self.user_connections[self.user.pk] += 1
+        self.room_connections[self.id] += 1
+        return True
+
+    def release_slot(self):
+        for counter, key in ((self.user_connections, self.user.pk),
+                             (self.room_connections, self.id)):
+            counter[key] -= 1
+            if counter[key] <= 0:
+                del counter[key]
+
+    async def room_allows(self):
+        """
+        Take a token from the room bucket.
+        """
+        if not self.room_rate:
+            return True
+        if self.shared_throttle:
+            return await RedisTokenBucket(f'chat:throttle:{self.id}',
+                                          *self.room_rate).consume()
+        if self.id not in self.room_buckets:
+            self.room_buckets[self.id] = TokenBucket(*self.room_rate)
+        return self.room_buckets[self.id].consume()
+
+    async def reject(self, reason, close_code=None):
+        """
+        Count a refused message, then drop it or close the socket.
+        """
+        metrics[reason] += 1
+        if close_code or self.throttle_action == 'close':
+            metrics['closed'] += 1
+            await self.close(code=close_code or 4029)
+        else:
+            await self.send(text_data=json.dumps({'type': 'throttled',
+                                                  'reason': reason}))
 
     async def connect(self):
         """Called when a new connection is received."""
         self.user = self.scope['user']
         self.id = self.scope['url_route']['kwargs']['course_id']
         self.room_group_name = 'chat_%s' % self.id
+        self.joined = False
+        self.outbox = []
+        self.flush_task = None
+        self.heartbeat_task = None
+        self.bucket = (TokenBucket(*self.connection_rate)
+                       if self.connection_rate else None)
+
+        # reject the handshake before joining the group
+        if not await self.authorize() or not self.acquire_slot():
+            await self.close()
+            return
+        self.joined = True
 
         # join room group
         await self.channel_layer.group_add(
@@ -25,34 +123,131 @@ class ChatConsumer(AsyncWebsocketConsumer):
         # accept connection
         await self.accept()
 
+        # replay the last messages of the room in one frame
+        if self.persist:
+            texts = await history.recent(self.id)
+            if texts:
+                await self.send(text_data='[' + ','.join(texts) + ']')
+
+        if self.track_presence:
+            if await presence.join(self.id, self.user.pk):
+                presence.presence_deltas.joined(self.channel_layer, self.id,
+                                                self.user.username)
+            self.heartbeat_task = asyncio.create_task(self.heartbeat())
+            await self.send(text_data=presence.presence_text(
+                await presence.online_count(self.id)))
+
+    async def heartbeat(self):
+        while True:
+            await asyncio.sleep(presence.HEARTBEAT_INTERVAL)
+            if await presence.touch(self.id, self.user.pk):
+                continue
+            # pruned while connected: count this socket again
+            if await presence.join(self.id, self.user.pk):
+                presence.presence_deltas.joined(self.channel_layer, self.id,
+                                                self.user.username)
+
     async def disconnect(self, close_code):
         """
         Called when the socket closes.
         """
+        if not self.joined:
+            return
+        self.joined = False
+        self.release_slot()
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+            if await presence.leave(self.id, self.user.pk):
+                presence.presence_deltas.left(self.channel_layer, self.id,
+                                              self.user.username)
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
+        if self.id not in self.room_connections:
+            # the room is empty in this process, e.g. while it shuts down
+            await message_buffer.close()
 
     # receive message from WebSocket
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         """Called whenever data is received."""
-        text_data_json = json.loads(text_data)
-        message = text_data_json['message']
+        if text_data is None:
+            # 1003: unsupported data
+            await self.reject('binary', close_code=1003)
+            return
+        if len(text_data) > self.max_message_size:
+            # 1009: message too big
+            await self.reject('oversized', close_code=1009)
+            return
+        if self.bucket and not self.bucket.consume():
+            await self.reject('throttled_connection')
+            return
+        try:
+            message = json.loads(text_data)['message']
+            if not isinstance(message, str):
+                raise TypeError
+        except (ValueError, KeyError, TypeError):
+            metrics['invalid'] += 1
+            return
+        if not await self.room_allows():
+            await self.reject('throttled_room')
+            return
+        now = timezone.now()
+        # serialize once here instead of once per room member
+        text = json.dumps({
+            'type': 'chat_message',
+            'message': message,
+            'user': self.user.username,
+            'datetime': now.isoformat(),
+        })
         # send message to room group
         await self.channel_layer.group_send(
             self.room_group_name,
             {
                 'type': 'chat_message',
-                'message': message,
-                'user': self.user.username,
-                'datetime': timezone.now().isoformat(),
+                'text': text,
             }
         )
+        if self.persist:
+            # store it in the room history and, in batches, in the database
+            await history.push(self.id, text)
+            message_buffer.add(ChatMessage(course_id=self.id,
+                                           user_id=self.user.pk,
+                                           content=message,
+                                           sent_on=now))
 
     async def chat_message(self, event):
         """
         Receive message from room group and
         send message to WebSocket.
         """
-        await self.send(text_data=json.dumps(event))
+        await self.send_event_text(event['text'])
+
+    async def presence_delta(self, event):
+        """
+        Forward users joining and leaving the room.
+        """
+        await self.send_event_text(event['text'])
+
+    async def send_event_text(self, text):
+        if not self.coalesce_delay:
+            await self.send(text_data=text)
+            return
+        self.outbox.append(text)
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.flush_outbox_later())
+
+    async def flush_outbox_later(self):
+        await asyncio.sleep(self.coalesce_delay)
+        self.flush_task = None
+        await self.flush_outbox()
+
+    async def flush_outbox(self):
+        """
+        Send the buffered messages as one JSON array frame.
+        """
+        texts, self.outbox = self.outbox, []
+        if texts:
+            await self.send(text_data='[' + ','.join(texts) + ']')
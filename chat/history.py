@@ -0,0 +1,69 @@
+"""
+Recent messages of each course room, kept in a Redis list
+trimmed to the last ``CHAT_HISTORY_SIZE`` entries.
+
+The list is rebuilt from the database when it is missing,
+e.g. after Redis restarted.
+"""
+import json
+from channels.db import database_sync_to_async
+from django.conf import settings
+from .models import ChatMessage
+from .redis_client import get_redis
+
+HISTORY_SIZE = getattr(settings, 'CHAT_HISTORY_SIZE', 50)
+
+
+def history_key(course_id):
+    return f'chat:history:{course_id}'
+
+
+def message_event(message):
+    """
+    The ``chat_message`` event of a stored message.
+    """
+    return {
+        'type': 'chat_message',
+        'message': message.content,
+        'user': message.user.username if message.user else None,
+        'datetime': message.sent_on.isoformat(),
+    }
+
+
+@database_sync_to_async
+def _load_events(course_id):
+    messages = ChatMessage.objects.filter(
+        course_id=course_id).select_related('user').order_by('-sent_on')
+    return [json.dumps(message_event(message))
+            for message in reversed(messages[:HISTORY_SIZE])]
+
+
+async def push(course_id, text):
+    """
+    Append a serialized event to the history of the room.
+    """
+    key = history_key(course_id)
+    async with get_redis().pipeline(transaction=False) as pipe:
+        pipe.rpush(key, text)
+        pipe.ltrim(key, -HISTORY_SIZE, -1)
+        await pipe.execute()
+
+
+async def recent(course_id):
+    """
+    Return the serialized events of the last messages,
+    oldest first.
+    """
+    key = history_key(course_id)
+    client = get_redis()
+    texts = await client.lrange(key, 0, -1)
+    if texts:
+        return [text.decode() for text in texts]
+    texts = await _load_events(course_id)
+    if texts:
+        # prepend, in case a new message was pushed meanwhile
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.lpush(key, *reversed(texts))
+            pipe.ltrim(key, -HISTORY_SIZE, -1)
+            await pipe.execute()
+    return texts
@@ -0,0 +1,116 @@
+"""
+Load-test harness for ChatConsumer.
+
+Simulated clients connect through ``WebsocketCommunicator`` to one room,
+on the configured channel layer. A few of them send messages while every
+client drains its socket. The result counts the WebSocket frames and the
+CPU time needed to deliver every message to every client, along with
+the delivery latency of each message.
+"""
+import asyncio
+import json
+import statistics
+import sys
+import time
+from collections import namedtuple
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.urls import re_path
+from .consumers import ChatConsumer
+
+LoadTestResult = namedtuple('LoadTestResult', [
+    'clients', 'messages', 'expected', 'delivered', 'frames',
+    'seconds', 'cpu_seconds', 'p50_ms', 'p99_ms'])
+
+
+class LoadTestConsumer(ChatConsumer):
+    """
+    Chat consumer without authorization, caps, throttling,
+    persistence or presence.
+    """
+    persist = False
+    track_presence = False
+    connection_rate = None
+    room_rate = None
+    max_connections_per_user = sys.maxsize
+    max_connections_per_room = sys.maxsize
+
+    async def authorize(self):
+        return True
+
+
+async def _drain(communicator, expected, timeout, latencies):
+    frames = delivered = 0
+    while delivered < expected:
+        try:
+            text = await communicator.receive_from(timeout=timeout)
+        except asyncio.TimeoutError:
+            break
+        received = time.perf_counter()
+        frames += 1
+        data = json.loads(text)
+        for event in data if isinstance(data, list) else [data]:
+            # messages carry the time they were sent at
+            latencies.append(received - float(event['message']))
+            delivered += 1
+    return frames, delivered
+
+
+def _percentile(values, percent):
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100)[percent - 1]
+
+
+async def run_load_test(clients=100, senders=5, messages=10,
+                        coalesce_ms=0, room=0, timeout=5):
+    """
+    Connect ``clients`` sockets to a room and have ``senders`` of them
+    send ``messages`` messages each.
+    """
+    # consumers ignore as_asgi() keyword arguments, so subclass instead
+    consumer = type('LoadTestConsumer', (LoadTestConsumer,),
+                    {'coalesce_delay': coalesce_ms / 1000}).as_asgi()
+    application = URLRouter([
+        re_path(r'ws/chat/room/(?P<course_id>\d+)/$', consumer),
+    ])
+    communicators = []
+    for _ in range(clients):
+        communicator = WebsocketCommunicator(application,
+                                             f'/ws/chat/room/{room}/')
+        communicator.scope['user'] = AnonymousUser()
+        connected, _ = await communicator.connect()
+        if not connected:
+            raise RuntimeError('Load test client could not connect.')
+        communicators.append(communicator)
+
+    total = senders * messages
+    latencies = []
+    start, cpu_start = time.perf_counter(), time.process_time()
+    drains = [asyncio.create_task(_drain(communicator, total, timeout,
+                                         latencies))
+              for communicator in communicators]
+
+    async def send(communicator):
+        for _ in range(messages):
+            await communicator.send_to(text_data=json.dumps(
+                {'message': repr(time.perf_counter())}))
+
+    await asyncio.gather(*(send(communicator)
+                           for communicator in communicators[:senders]))
+    counts = await asyncio.gather(*drains)
+    seconds = time.perf_counter() - start
+    cpu_seconds = time.process_time() - cpu_start
+
+    for communicator in communicators:
+        await communicator.disconnect()
+    return LoadTestResult(clients=clients,
+                          messages=total,
+                          expected=total * clients,
+                          delivered=sum(delivered for _, delivered in counts),
+                          frames=sum(frames for frames, _ in counts),
+                          seconds=seconds,
+                          cpu_seconds=cpu_seconds,
+                          p50_ms=_percentile(latencies, 50) * 1000,
+                          p99_ms=_percentile(latencies, 99) * 1000)
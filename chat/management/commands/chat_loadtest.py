@@ -0,0 +1,63 @@
+import asyncio
+import json
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from chat.loadtest import run_load_test
+
+
+class Command(BaseCommand):
+    help = ('Benchmark chat fan-out: frames, CPU time, delivery latency '
+            'and throughput for each combination of room size and '
+            'coalescing delay.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, nargs='+', default=[500],
+                            help='Room sizes to benchmark.')
+        parser.add_argument('--senders', type=int, default=10)
+        parser.add_argument('--messages', type=int, default=10,
+                            help='Messages sent by each sender.')
+        parser.add_argument('--coalesce-ms', type=int, nargs='+',
+                            default=[0, 10],
+                            help='Coalescing delays to compare; 0 is off.')
+        parser.add_argument('--max-p99-ms', type=float,
+                            help='Fail if any run has a higher p99 latency.')
+        parser.add_argument('--json', action='store_true',
+                            help='Print one JSON object per run.')
+
+    def handle(self, *args, **options):
+        if not options['json']:
+            self.stdout.write(
+                f'layer: {settings.CHANNEL_LAYERS["default"]["BACKEND"]}')
+            self.stdout.write(
+                f'{"clients":>7} {"coalesce":>9} {"delivered":>14} '
+                f'{"frames":>8} {"cpu s":>7} {"msg/s":>8} '
+                f'{"p50 ms":>8} {"p99 ms":>8}')
+        failures = []
+        for clients in options['clients']:
+            for coalesce_ms in options['coalesce_ms']:
+                result = asyncio.run(run_load_test(
+                    clients=clients,
+                    senders=options['senders'],
+                    messages=options['messages'],
+                    coalesce_ms=coalesce_ms))
+                rate = result.delivered / result.seconds
+                if options['json']:
+                    self.stdout.write(json.dumps(
+                        dict(result._asdict(), coalesce_ms=coalesce_ms,
+                             messages_per_second=rate)))
+                else:
+                    self.stdout.write(
+                        f'{clients:>7} {coalesce_ms:>7}ms '
+                        f'{result.delivered:>7}/{result.expected:<6} '
+                        f'{result.frames:>8} {result.cpu_seconds:>7.2f} '
+                        f'{rate:>8.0f} {result.p50_ms:>8.1f} '
+                        f'{result.p99_ms:>8.1f}')
+                if result.delivered < result.expected:
+                    failures.append(f'{clients} clients, {coalesce_ms}ms: '
+                                    f'messages lost')
+                if (options['max_p99_ms'] is not None
+                        and result.p99_ms > options['max_p99_ms']):
+                    failures.append(f'{clients} clients, {coalesce_ms}ms: '
+                                    f'p99 {result.p99_ms:.1f}ms')
+        if failures:
+            raise CommandError('; '.join(failures))
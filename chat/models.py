@@ -1,3 +1,24 @@
 from django.db import models
+from django.contrib.auth.models import User
+from courses.models import Course
 
-# Create your models here.
+
+class ChatMessage(models.Model):
+    """
+    A message sent to the chat room of a course.
+    """
+    course = models.ForeignKey(Course, related_name='chat_messages',
+                               on_delete=models.CASCADE)
+    user = models.ForeignKey(User, related_name='chat_messages',
+                             null=True, on_delete=models.SET_NULL)
+    content = models.TextField()
+    sent_on = models.DateTimeField()
+
+    class Meta:
+        ordering = ['sent_on']
+        indexes = [
+            models.Index(fields=['course', '-sent_on']),
+        ]
+
+    def __str__(self):
+        return f'{self.user} on {self.course}: {self.content[:50]}'
@@ -0,0 +1,175 @@
+"""
+Who is online in each course chat room.
+
+Each room is a Redis sorted set of user ids scored with the time of
+their last heartbeat, next to a hash counting each user's open sockets
+in the room. A user goes offline when their last socket closes, or
+when their heartbeat is older than ``CHAT_PRESENCE_TTL`` seconds, e.g.
+after a worker died; such members are pruned lazily.
+Joins and leaves are published to the room as debounced deltas rather
+than full member lists.
+"""
+import asyncio
+import json
+import time
+from django.conf import settings
+from .redis_client import get_redis, get_sync_redis
+
+PRESENCE_TTL = getattr(settings, 'CHAT_PRESENCE_TTL', 60)
+HEARTBEAT_INTERVAL = getattr(settings, 'CHAT_PRESENCE_HEARTBEAT', 20)
+DEBOUNCE_DELAY = getattr(settings, 'CHAT_PRESENCE_DEBOUNCE', 2.0)
+
+
+def presence_key(course_id):
+    return f'chat:presence:{course_id}'
+
+
+def connections_key(course_id):
+    return f'chat:presence:{course_id}:connections'
+
+
+JOIN_SCRIPT = """
+local now = tonumber(ARGV[2])
+local ttl = tonumber(ARGV[3])
+local stale = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now - ttl)
+for _, member in ipairs(stale) do
+    redis.call('HDEL', KEYS[2], member)
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - ttl)
+redis.call('HINCRBY', KEYS[2], ARGV[1], 1)
+local added = redis.call('ZADD', KEYS[1], now, ARGV[1])
+redis.call('EXPIRE', KEYS[1], ttl)
+redis.call('EXPIRE', KEYS[2], ttl)
+return added
+"""
+
+TOUCH_SCRIPT = """
+if redis.call('HEXISTS', KEYS[2], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return 1
+"""
+
+LEAVE_SCRIPT = """
+if redis.call('HINCRBY', KEYS[2], ARGV[1], -1) > 0 then
+    return 0
+end
+redis.call('HDEL', KEYS[2], ARGV[1])
+return redis.call('ZREM', KEYS[1], ARGV[1])
+"""
+
+_scripts = {}
+
+
+async def _run(script, course_id, *args):
+    client = get_redis()
+    if (client, script) not in _scripts:
+        _scripts[client, script] = client.register_script(script)
+    return await _scripts[client, script](
+        keys=[presence_key(course_id), connections_key(course_id)],
+        args=args)
+
+
+async def join(course_id, user_id):
+    """
+    Count a new socket of the user in the room.
+    Return True if the user was not online before.
+    """
+    return bool(await _run(JOIN_SCRIPT, course_id, user_id, time.time(),
+                           PRESENCE_TTL))
+
+
+async def touch(course_id, user_id):
+    """
+    Renew the user's heartbeat. Return False if the user is no longer
+    counted in the room, e.g. because they were pruned meanwhile.
+    """
+    return bool(await _run(TOUCH_SCRIPT, course_id, user_id, time.time(),
+                           PRESENCE_TTL))
+
+
+async def leave(course_id, user_id):
+    """
+    Count a closed socket of the user. Return True if it was their
+    last one in the room and they went offline.
+    """
+    return bool(await _run(LEAVE_SCRIPT, course_id, user_id))
+
+
+async def online_count(course_id):
+    return await get_redis().zcount(presence_key(course_id),
+                                    time.time() - PRESENCE_TTL, '+inf')
+
+
+def online_counts(course_ids):
+    """
+    Return the number of online users of many rooms
+    in a single pipelined round trip.
+    """
+    since = time.time() - PRESENCE_TTL
+    with get_sync_redis().pipeline(transaction=False) as pipe:
+        for course_id in course_ids:
+            pipe.zcount(presence_key(course_id), since, '+inf')
+        counts = pipe.execute()
+    return dict(zip(course_ids, counts))
+
+
+def presence_text(online, joined=(), left=()):
+    return json.dumps({'type': 'presence', 'online': online,
+                       'joined': sorted(joined), 'left': sorted(left)})
+
+
+class PresenceDeltas:
+    """
+    Collects the joins and leaves of each room and publishes them
+    as one ``presence_delta`` event per ``delay`` seconds. A leave
+    and a join of the same user within that window cancel out.
+    """
+
+    def __init__(self, delay=DEBOUNCE_DELAY):
+        self.delay = delay
+        self.pending = {}
+        self._tasks = set()
+
+    def _record(self, channel_layer, course_id, username, joining):
+        if course_id not in self.pending:
+            self.pending[course_id] = (set(), set())
+            task = asyncio.get_running_loop().create_task(
+                self._publish_later(channel_layer, course_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        joined, left = self.pending[course_id]
+        if joining:
+            pending, opposite = joined, left
+        else:
+            pending, opposite = left, joined
+        if username in opposite:
+            opposite.discard(username)
+        else:
+            pending.add(username)
+
+    def joined(self, channel_layer, course_id, username):
+        self._record(channel_layer, course_id, username, joining=True)
+
+    def left(self, channel_layer, course_id, username):
+        self._record(channel_layer, course_id, username, joining=False)
+
+    async def _publish_later(self, channel_layer, course_id):
+        await asyncio.sleep(self.delay)
+        joined, left = self.pending.pop(course_id)
+        if not joined and not left:
+            return
+        await channel_layer.group_send(
+            f'chat_{course_id}',
+            {
+                'type': 'presence_delta',
+                'text': presence_text(await online_count(course_id),
+                                      joined, left),
+            }
+        )
+
+
+presence_deltas = PresenceDeltas()
@@ -0,0 +1,32 @@
+"""
+Shared Redis clients for the chat subsystems.
+"""
+import asyncio
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+
+REDIS_URL = getattr(settings, 'CHAT_REDIS_URL', 'redis://127.0.0.1:6379')
+
+_clients = {}
+_sync_client = None
+
+
+def get_redis():
+    """
+    Return the Redis client of the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _clients:
+        _clients[loop] = aioredis.from_url(REDIS_URL)
+    return _clients[loop]
+
+
+def get_sync_redis():
+    """
+    Return the Redis client for synchronous views.
+    """
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = redis.Redis.from_url(REDIS_URL)
+    return _sync_client
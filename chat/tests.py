@@ -1,3 +1,293 @@
-from django.test import TestCase
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+from unittest import mock
+import fakeredis
+import redis
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from courses.membership import enrolled_courses_key
+from . import presence
+from .consumers import ChatConsumer
+from .loadtest import run_load_test
+from .throttling import metrics
 
-# Create your tests here.
+IN_MEMORY_CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    }
+}
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class ChatFanOutTest(SimpleTestCase):
+    """
+    Every message sent to a room reaches every client.
+    """
+
+    async def test_fan_out(self):
+        result = await run_load_test(clients=20, senders=3, messages=5)
+        self.assertEqual(result.delivered, result.expected)
+        self.assertEqual(result.frames, result.expected)
+
+    async def test_coalesced_fan_out(self):
+        result = await run_load_test(clients=20, senders=3, messages=5,
+                                     coalesce_ms=20)
+        self.assertEqual(result.delivered, result.expected)
+        self.assertLess(result.frames, result.expected)
+
+
+class FakeRedisMixin:
+    """
+    Points the presence module at a fresh in-memory Redis.
+    """
+
+    def setUp(self):
+        server = fakeredis.FakeServer()
+        self.redis = fakeredis.FakeAsyncRedis(server=server)
+        self.sync_redis = fakeredis.FakeRedis(server=server)
+        for name, client in (('get_redis', self.redis),
+                             ('get_sync_redis', self.sync_redis)):
+            patcher = mock.patch(f'chat.presence.{name}',
+                                 return_value=client)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class RecordingChannelLayer:
+
+    def __init__(self):
+        self.sent = []
+
+    async def group_send(self, group, message):
+        self.sent.append((group, message))
+
+
+class PresenceTest(FakeRedisMixin, SimpleTestCase):
+    """
+    Users stay online until their last socket closes or their
+    heartbeat expires.
+    """
+
+    async def test_connections(self):
+        self.assertTrue(await presence.join(1, 7))
+        self.assertFalse(await presence.join(1, 7))
+        self.assertFalse(await presence.leave(1, 7))
+        self.assertEqual(await presence.online_count(1), 1)
+        self.assertTrue(await presence.touch(1, 7))
+        self.assertTrue(await presence.leave(1, 7))
+        self.assertEqual(await presence.online_count(1), 0)
+        # a heartbeat racing the last leave doesn't bring the user back
+        self.assertFalse(await presence.touch(1, 7))
+        self.assertEqual(await presence.online_count(1), 0)
+
+    async def test_heartbeat_expiry(self):
+        await presence.join(1, 7)
+        await presence.join(1, 7)
+        # user 7 missed their heartbeats, e.g. after a worker died
+        await self.redis.zadd(presence.presence_key(1), {7: 0})
+        self.assertEqual(await presence.online_count(1), 0)
+        # the next join prunes them along with their socket count
+        self.assertTrue(await presence.join(1, 8))
+        self.assertEqual(await self.redis.zrange(presence.presence_key(1),
+                                                 0, -1), [b'8'])
+        self.assertFalse(await presence.touch(1, 7))
+        self.assertTrue(await presence.join(1, 7))
+
+    async def test_online_counts(self):
+        await presence.join(1, 7)
+        await presence.join(1, 8)
+        await presence.join(2, 7)
+        self.assertEqual(presence.online_counts([1, 2, 3]),
+                         {1: 2, 2: 1, 3: 0})
+
+    async def test_deltas(self):
+        layer = RecordingChannelLayer()
+        deltas = presence.PresenceDeltas(delay=0.01)
+        await presence.join(1, 7)
+        deltas.joined(layer, 1, 'ada')
+        deltas.joined(layer, 1, 'bob')
+        # a quick reconnect cancels out
+        deltas.left(layer, 1, 'bob')
+        deltas.joined(layer, 1, 'bob')
+        deltas.left(layer, 1, 'ada')
+        deltas.joined(layer, 1, 'ada')
+        deltas.left(layer, 1, 'cy')
+        await asyncio.sleep(0.05)
+        self.assertEqual(len(layer.sent), 1)
+        group, message = layer.sent[0]
+        self.assertEqual(group, 'chat_1')
+        self.assertEqual(json.loads(message['text']),
+                         {'type': 'presence', 'online': 1,
+                          'joined': ['ada', 'bob'], 'left': ['cy']})
+
+
+class CoursePresenceViewTest(FakeRedisMixin, SimpleTestCase):
+
+    def get(self, courses):
+        response = self.client.get(reverse('chat:course_presence'),
+                                   {'courses': courses})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['online']
+
+    def test_counts(self):
+        self.sync_redis.zadd(presence.presence_key(1), {7: time.time()})
+        self.assertEqual(self.get('1,2'), {'1': 1, '2': 0})
+
+    @override_settings(CHAT_TRACK_PRESENCE=False)
+    def test_presence_not_tracked(self):
+        self.assertEqual(self.get('1,2'), {})
+
+    def test_redis_unavailable(self):
+        with mock.patch('chat.views.online_counts',
+                        side_effect=redis.ConnectionError), \
+                self.assertLogs('chat.views', 'WARNING'):
+            self.assertEqual(self.get('1,2'), {})
+
+
+class ConsumerTestMixin:
+    """
+    Connects students to rooms through ``consumer``, a chat consumer
+    without persistence, presence or throttling unless overridden.
+    """
+    consumer_attrs = {}
+
+    def setUp(self):
+        cache.clear()
+        self.consumer = type('TestConsumer', (ChatConsumer,), {
+            'persist': False,
+            'track_presence': False,
+            'connection_rate': None,
+            'room_rate': None,
+            **self.consumer_attrs,
+        })
+
+    def student(self, pk, *course_ids):
+        cache.set(enrolled_courses_key(pk), frozenset(course_ids))
+        return SimpleNamespace(pk=pk, username=f'student{pk}',
+                               is_authenticated=True)
+
+    async def connect(self, user, course_id=1):
+        communicator = WebsocketCommunicator(self.consumer.as_asgi(),
+                                             f'/ws/chat/room/{course_id}/')
+        communicator.scope['user'] = user
+        communicator.scope['url_route'] = {
+            'kwargs': {'course_id': str(course_id)}}
+        connected, _ = await communicator.connect()
+        return communicator, connected
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class ChatAccessTest(ConsumerTestMixin, SimpleTestCase):
+    """
+    Only students of a course join its room, within the per-user
+    and per-room caps.
+    """
+    consumer_attrs = {'max_connections_per_user': 2,
+                      'max_connections_per_room': 3}
+
+    async def test_enrolled_only(self):
+        communicator, connected = await self.connect(self.student(1, 2))
+        self.assertFalse(connected)
+        self.assertNotIn('chat_1', get_channel_layer().groups)
+        communicator, connected = await self.connect(self.student(2, 1))
+        self.assertTrue(connected)
+        self.assertEqual(len(get_channel_layer().groups['chat_1']), 1)
+        await communicator.disconnect()
+
+    async def test_user_cap(self):
+        user = self.student(1, 1, 2)
+        first, _ = await self.connect(user)
+        second, _ = await self.connect(user, course_id=2)
+        _, connected = await self.connect(user)
+        self.assertFalse(connected)
+        # closing a socket frees its slot
+        await first.disconnect()
+        third, connected = await self.connect(user)
+        self.assertTrue(connected)
+        await second.disconnect()
+        await third.disconnect()
+
+    async def test_room_cap(self):
+        sockets = [(await self.connect(self.student(pk, 1)))[0]
+                   for pk in range(3)]
+        _, connected = await self.connect(self.student(3, 1))
+        self.assertFalse(connected)
+        await sockets.pop().disconnect()
+        communicator, connected = await self.connect(self.student(3, 1))
+        self.assertTrue(connected)
+        for communicator in sockets + [communicator]:
+            await communicator.disconnect()
+        self.assertFalse(ChatConsumer.room_connections)
+        self.assertFalse(ChatConsumer.user_connections)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class ChatLimitsTest(ConsumerTestMixin, SimpleTestCase):
+    """
+    Oversized, binary and too frequent frames are refused and counted.
+    """
+    consumer_attrs = {'max_message_size': 50,
+                      'connection_rate': (0.001, 2)}
+
+    def setUp(self):
+        super().setUp()
+        metrics.clear()
+
+    async def assertClosed(self, communicator, code):
+        output = await communicator.receive_output()
+        self.assertEqual(output, {'type': 'websocket.close', 'code': code})
+
+    async def test_oversized(self):
+        communicator, _ = await self.connect(self.student(1, 1))
+        await communicator.send_to(text_data='x' * 51)
+        await self.assertClosed(communicator, 1009)
+        self.assertEqual(metrics, {'oversized': 1, 'closed': 1})
+
+    async def test_binary(self):
+        communicator, _ = await self.connect(self.student(1, 1))
+        await communicator.send_to(bytes_data=b'message')
+        await self.assertClosed(communicator, 1003)
+        self.assertEqual(metrics, {'binary': 1, 'closed': 1})
+
+    async def send_messages(self, communicator, count):
+        for i in range(count):
+            await communicator.send_to(text_data=json.dumps(
+                {'message': str(i)}))
+
+    async def receive(self, communicator, count):
+        """
+        Return the next ``count`` frames; the frames sent through the
+        group may come after those sent directly.
+        """
+        frames = []
+        for _ in range(count):
+            output = await communicator.receive_output()
+            frames.append(json.loads(output['text'])
+                          if 'text' in output else output)
+        return frames
+
+    async def test_throttle_drop(self):
+        communicator, _ = await self.connect(self.student(1, 1))
+        # invalid frames take a token too
+        await communicator.send_to(text_data='not json')
+        await self.send_messages(communicator, 2)
+        frames = await self.receive(communicator, 2)
+        self.assertIn({'type': 'throttled',
+                       'reason': 'throttled_connection'}, frames)
+        self.assertEqual([frame['message'] for frame in frames
+                          if frame['type'] == 'chat_message'], ['0'])
+        self.assertEqual(metrics, {'invalid': 1, 'throttled_connection': 1})
+        await communicator.disconnect()
+
+    async def test_throttle_close(self):
+        self.consumer.throttle_action = 'close'
+        communicator, _ = await self.connect(self.student(1, 1))
+        await self.send_messages(communicator, 3)
+        frames = await self.receive(communicator, 3)
+        self.assertIn({'type': 'websocket.close', 'code': 4029}, frames)
+        self.assertEqual(metrics, {'throttled_connection': 1, 'closed': 1})
@@ -0,0 +1,79 @@
+"""
+Token buckets limiting how fast chat messages are accepted.
+
+Buckets are held in-process. Room buckets can instead be shared by
+all workers through Redis with ``CHAT_THROTTLE_SHARED = True``.
+Dropped messages are counted in ``metrics``.
+"""
+import time
+from collections import Counter
+from .redis_client import get_redis
+
+# throttling events in this process, served by the chat_metrics view
+metrics = Counter()
+
+
+class TokenBucket:
+    """
+    Allows bursts of ``capacity`` messages, refilled at
+    ``rate`` messages per second.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def consume(self, tokens=1):
+        now = time.monotonic()
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < tokens:
+            return False
+        self.tokens -= tokens
+        return True
+
+
+REDIS_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local requested = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= requested then
+    tokens = tokens - requested
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return allowed
+"""
+
+_scripts = {}
+
+
+class RedisTokenBucket:
+    """
+    A token bucket stored in a Redis hash, shared by every worker.
+    The refill and the take happen atomically in a Lua script.
+    """
+
+    def __init__(self, key, rate, capacity):
+        self.key = key
+        self.rate = rate
+        self.capacity = capacity
+
+    async def consume(self, tokens=1):
+        client = get_redis()
+        if client not in _scripts:
+            _scripts[client] = client.register_script(REDIS_BUCKET_SCRIPT)
+        allowed = await _scripts[client](
+            keys=[self.key],
+            args=[self.rate, self.capacity, time.time(), tokens])
+        return bool(allowed)
@@ -6,4 +6,6 @@ app_name = 'chat'
 urlpatterns = [
     path('room/<int:course_id>/', views.course_chat_room,
          name='course_chat_room'),
+    path('presence/', views.course_presence, name='course_presence'),
+    path('metrics/', views.chat_metrics, name='chat_metrics'),
 ]
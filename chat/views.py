@@ -1,14 +1,58 @@
+import logging
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404
-from django.http import HttpResponseForbidden
+from django.http import (HttpResponseBadRequest, HttpResponseForbidden,
+                         JsonResponse)
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+from redis import RedisError
+from courses.models import Course
+from courses.membership import is_enrolled
+from .presence import online_counts
+from .throttling import metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_PRESENCE_COURSES = 200
 
 
 @login_required
 def course_chat_room(request, course_id):
     try:
-        # retrieve course with given id joined by the current user
-        course = request.user.courses_joined.get(id=course_id)
-    except:
+        # user must be a student of the course
+        if not is_enrolled(request.user, course_id):
+            raise Course.DoesNotExist
+        course = Course.objects.get(id=course_id)
+    except Course.DoesNotExist:
         # user is not a student of the course or course does not exist
         return HttpResponseForbidden()
     return render(request, 'chat/room.html', {'course': course})
+
+
+@staff_member_required
+def chat_metrics(request):
+    """
+    Messages refused by this worker, by reason.
+    """
+    return JsonResponse(dict(metrics))
+
+
+def course_presence(request):
+    """
+    Online users of many course rooms: ?courses=1,2,3
+
+    Rooms are reported empty when presence isn't tracked or Redis
+    can't be reached.
+    """
+    try:
+        course_ids = [int(id) for id in
+                      request.GET.get('courses', '').split(',') if id]
+    except ValueError:
+        return HttpResponseBadRequest()
+    counts = {}
+    if getattr(settings, 'CHAT_TRACK_PRESENCE', True):
+        try:
+            counts = online_counts(course_ids[:MAX_PRESENCE_COURSES])
+        except RedisError as e:
+            logger.warning('Could not count online users: %r', e)
+    return JsonResponse({'online': counts})
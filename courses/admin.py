@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Subject, Course, Module
+from .search import search_courses, search_enabled
 
 
 @admin.register(Subject)
@@ -19,3 +20,9 @@ class CourseAdmin(admin.ModelAdmin):
     search_fields = ["title", "overview"]
     prepopulated_fields = {"slug": ("title",)}
     inlines = [ModuleInline]
+
+    def get_search_results(self, request, queryset, search_term):
+        # use the full-text index instead of ILIKE scans
+        if not search_term or not search_enabled():
+            return super().get_search_results(request, queryset, search_term)
+        return search_courses(search_term, queryset), False
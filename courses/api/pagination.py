@@ -0,0 +1,16 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CourseCursorPagination(CursorPagination):
+    """
+    Keyset pagination: every page is an index range scan,
+    however deep the client goes.
+    """
+    ordering = ('-created', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class SubjectCursorPagination(CourseCursorPagination):
+    ordering = ('title', 'id')
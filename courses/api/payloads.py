@@ -0,0 +1,79 @@
+"""
+Materialized JSON payloads for the course contents endpoint.
+
+The serialized course is stored in the cache together with its ETag.
+Each module is also stored on its own, so a change to one module only
+re-serializes that module when the course payload is rebuilt. Keys
+embed the course and module versions, bumped on every write.
+"""
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+from courses.loaders import prefetch_module_contents
+from courses.rendering import render_module_items
+from courses.versioning import COURSE, MODULE, get_version, get_versions
+from .serializers import (CourseWithContentsSerializer,
+                          ModuleWithContentsSerializer)
+
+COURSE_CONTENTS_CACHE_TIMEOUT = getattr(
+    settings, 'COURSE_CONTENTS_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def course_contents_key(course_id, version):
+    return f'course_contents:{course_id}:{version}'
+
+
+def module_contents_key(module_id, version):
+    return f'course_contents_module:{module_id}:{version}'
+
+
+class CourseHeaderSerializer(CourseWithContentsSerializer):
+    """
+    Course fields without the nested modules.
+    """
+    modules = None
+
+    class Meta(CourseWithContentsSerializer.Meta):
+        fields = [field for field in CourseWithContentsSerializer.Meta.fields
+                  if field != 'modules']
+
+
+def build_course_contents(course):
+    """
+    Serialize the course, reusing the cached module payloads and
+    only serializing the modules that changed since the last build.
+    Return a ``(etag, payload)`` tuple.
+    """
+    modules = list(course.modules.all())
+    versions = get_versions(MODULE, [module.id for module in modules])
+    keys = {module_contents_key(module.id, versions[module.id]): module
+            for module in modules}
+    cached = cache.get_many(list(keys))
+    stale = [module for key, module in keys.items() if key not in cached]
+    if stale:
+        prefetch_module_contents(*stale)
+        render_module_items(*stale)
+        fresh = {key: ModuleWithContentsSerializer(module).data
+                 for key, module in keys.items() if module in stale}
+        cache.set_many(fresh, COURSE_CONTENTS_CACHE_TIMEOUT)
+        cached.update(fresh)
+    data = CourseHeaderSerializer(course).data
+    data['modules'] = [cached[key] for key in keys]
+    payload = JSONRenderer().render(data)
+    etag = hashlib.md5(payload).hexdigest()
+    return etag, payload
+
+
+def get_course_contents(course):
+    """
+    Return the ``(etag, payload)`` of the course contents,
+    building and storing it on a cache miss.
+    """
+    key = course_contents_key(course.id, get_version(COURSE, course.id))
+    entry = cache.get(key)
+    if entry is None:
+        entry = build_course_contents(course)
+        cache.set(key, entry, COURSE_CONTENTS_CACHE_TIMEOUT)
+    return entry
+
@@ -1,6 +1,7 @@
 from rest_framework.permissions import BasePermission
+from courses.membership import is_enrolled
 
 
 class IsEnrolled(BasePermission):
     def has_object_permission(self, request, view, obj):
-        return obj.students.filter(id=request.user.id).exists()
+        return is_enrolled(request.user, obj.id)
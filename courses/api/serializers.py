@@ -1,8 +1,39 @@
 from rest_framework import serializers
-from courses.models import Subject, Course, Module, Content
-
-
-class SubjectSerializer(serializers.ModelSerializer):
+from courses.models import Subject, Course, Module, Content, Upload
+from courses.uploads import CHUNK_SIZE
+
+
+def requested_fields(request):
+    """
+    Return the field names listed in the ``fields`` query parameter,
+    or None when all fields are wanted.
+    """
+    if request is None or not request.query_params.get('fields'):
+        return None
+    return {name.strip()
+            for name in request.query_params['fields'].split(',')
+            if name.strip()}
+
+
+class SparseFieldsetMixin:
+    """
+    Drop the fields not listed in the ``fields`` query parameter,
+    which must only name fields of the serializer.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = requested_fields(self.context.get('request'))
+        if fields is not None:
+            unknown = ', '.join(sorted(fields - set(self.fields)))
+            if unknown:
+                raise serializers.ValidationError(
+                    {'fields': f'Unknown fields: {unknown}.'})
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+
+
+class SubjectSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Subject
         fields = ['id', 'title', 'slug']
@@ -14,7 +45,7 @@ class ModuleSerializer(serializers.ModelSerializer):
         fields = ['order', 'title', 'description']
 
 
-class CourseSerializer(serializers.ModelSerializer):
+class CourseSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     modules = ModuleSerializer(many=True, read_only=True)
 
     class Meta:
@@ -24,6 +55,15 @@ class CourseSerializer(serializers.ModelSerializer):
                   'modules']
 
 
+class CourseSearchSerializer(serializers.ModelSerializer):
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Course
+        fields = ['id', 'subject', 'title', 'slug',
+                  'overview', 'created', 'owner', 'rank']
+
+
 class ItemRelatedField(serializers.RelatedField):
 
     def to_representation(self, value):
@@ -54,3 +94,16 @@ class CourseWithContentsSerializer(serializers.ModelSerializer):
         model = Course
         fields = ['id', 'subject', 'title', 'slug',
                   'overview', 'created', 'owner', 'modules']
+
+
+class UploadSerializer(serializers.ModelSerializer):
+    chunk_size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Upload
+        fields = ['id', 'model', 'filename', 'size', 'sha256',
+                  'offset', 'chunk_size']
+        read_only_fields = ['offset']
+
+    def get_chunk_size(self, obj):
+        return CHUNK_SIZE
@@ -9,6 +9,13 @@ router = routers.DefaultRouter()
 router.register('courses', views.CourseViewSet)
 
 urlpatterns = [
+    path('token/', views.TokenView.as_view(), name='token'),
+    path('uploads/', views.UploadView.as_view(), name='upload'),
+    path('uploads/<uuid:pk>/', views.UploadDetailView.as_view(),
+         name='upload_detail'),
+    path('uploads/<uuid:pk>/complete/', views.UploadCompleteView.as_view(),
+         name='upload_complete'),
+    path('search/', views.CourseSearchView.as_view(), name='course_search'),
     path('subjects/', views.SubjectListView.as_view(),
          name='subject_list'),
     path('subjects/<pk>/', views.SubjectDetailView.as_view(),
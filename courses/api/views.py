@@ -1,50 +1,341 @@
+import re
+from django.contrib.auth.models import User
+from django.http import (HttpResponse, HttpResponseNotModified,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from django.utils.http import parse_etags
+from django.views.decorators.http import condition
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import generics, viewsets
+from rest_framework import generics, viewsets, status
 from rest_framework.authentication import BasicAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.decorators import action
-from courses.models import Subject, Course
-from courses.api.serializers import SubjectSerializer, CourseSerializer
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from courses.models import Subject, Course, Module, Upload
+from courses.archive import ArchiveError, export_courses, import_courses
+from courses.enrollment import bulk_enroll
+from courses.conditional import (api_catalog_etag, api_course_etag,
+                                 api_course_last_modified, api_subject_etag,
+                                 api_subject_last_modified,
+                                 cache_for_anonymous)
+from courses.search import search_courses
+from courses.uploads import (OffsetMismatch, UploadError, complete_upload,
+                             discard_upload, start_upload, write_chunk)
+from courses.api.serializers import (SubjectSerializer, CourseSerializer,
+                                     CourseSearchSerializer, UploadSerializer,
+                                     requested_fields)
+from courses.api.pagination import (CourseCursorPagination,
+                                    SubjectCursorPagination)
 from courses.api.permissions import IsEnrolled
+from courses.api.authentication import (SignedTokenAuthentication,
+                                        TOKEN_MAX_AGE, issue_token)
 from courses.api.serializers import CourseWithContentsSerializer
+from courses.api.payloads import get_course_contents
+
+
+# tokens are checked first; Basic credentials still work but are slow
+API_AUTHENTICATION = [SignedTokenAuthentication, BasicAuthentication]
+
+
+def _id_list(data, name):
+    """
+    Return the list of integer ids under ``name`` in the request data.
+    """
+    ids = data.get(name) if hasattr(data, 'get') else None
+    if not isinstance(ids, list):
+        raise ValidationError({name: 'Expected a list of ids.'})
+    try:
+        return list(dict.fromkeys(int(id) for id in ids))
+    except (TypeError, ValueError):
+        raise ValidationError({name: 'Expected a list of ids.'})
 
 
 class CourseViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Courses, a page at a time; ``?fields=id,title`` limits the fields
+    returned and skips loading the modules unless they are listed.
+    """
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
+    pagination_class = CourseCursorPagination
+
+    def get_queryset(self):
+        # the search vector is never serialized
+        queryset = super().get_queryset().defer('search_vector')
+        if self.action in ('list', 'retrieve'):
+            fields = requested_fields(self.request)
+            if fields is None or 'modules' in fields:
+                queryset = queryset.prefetch_related('modules')
+        return queryset
+
+    @method_decorator(cache_for_anonymous)
+    @method_decorator(condition(etag_func=api_catalog_etag))
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @method_decorator(cache_for_anonymous)
+    @method_decorator(condition(etag_func=api_course_etag,
+                                last_modified_func=api_course_last_modified))
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
     @action(detail=True,
             methods=['post'],
-            authentication_classes=[BasicAuthentication],
+            authentication_classes=API_AUTHENTICATION,
             permission_classes=[IsAuthenticated])
     def enroll(self, request, *args, **kwargs):
         course = self.get_object()
         course.students.add(request.user)
         return Response({'enrolled': True})
 
+    @action(detail=False,
+            methods=['post'],
+            url_path='enroll',
+            url_name='bulk-enroll',
+            authentication_classes=API_AUTHENTICATION,
+            permission_classes=[IsAuthenticated])
+    def bulk_enroll(self, request, *args, **kwargs):
+        """
+        Enroll the current user in the courses listed in ``courses``.
+        """
+        course_ids = _id_list(request.data, 'courses')
+        found = set(Course.objects.filter(id__in=course_ids)
+                    .values_list('id', flat=True))
+        created = bulk_enroll(found, [request.user.id])
+        results = []
+        for course_id in course_ids:
+            if course_id in found:
+                results.append({'course': course_id, 'enrolled': True,
+                                'created': (course_id, request.user.id)
+                                in created})
+            else:
+                results.append({'course': course_id, 'enrolled': False,
+                                'error': 'Not found.'})
+        return Response({'results': results})
+
+    @action(detail=True,
+            methods=['post'],
+            authentication_classes=API_AUTHENTICATION,
+            permission_classes=[IsAuthenticated])
+    def enroll_users(self, request, *args, **kwargs):
+        """
+        Enroll the users listed in ``users`` in the course;
+        only the course owner or staff can do this.
+        """
+        course = self.get_object()
+        if course.owner_id != request.user.id and not request.user.is_staff:
+            raise PermissionDenied()
+        user_ids = _id_list(request.data, 'users')
+        found = set(User.objects.filter(id__in=user_ids)
+                    .values_list('id', flat=True))
+        created = bulk_enroll([course.id], found)
+        results = []
+        for user_id in user_ids:
+            if user_id in found:
+                results.append({'user': user_id, 'enrolled': True,
+                                'created': (course.id, user_id) in created})
+            else:
+                results.append({'user': user_id, 'enrolled': False,
+                                'error': 'Not found.'})
+        return Response({'results': results})
+
     @action(detail=True,
             methods=['get'],
             serializer_class=CourseWithContentsSerializer,
-            authentication_classes=[BasicAuthentication],
+            authentication_classes=API_AUTHENTICATION,
             permission_classes=[IsAuthenticated, IsEnrolled])
     def contents(self, request, *args, **kwargs):
-        return self.retrieve(request, *args, **kwargs)
+        course = self.get_object()
+        # serve the materialized payload, answering revalidations with 304
+        etag, payload = get_course_contents(course)
+        etag = f'"{etag}"'
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(payload, content_type='application/json')
+        response['ETag'] = etag
+        return response
+
+    @action(detail=False,
+            methods=['get'],
+            permission_classes=[IsAdminUser])
+    def export(self, request, *args, **kwargs):
+        courses = self.get_queryset()
+        if 'subject' in request.query_params:
+            courses = courses.filter(
+                subject__slug__in=request.query_params.getlist('subject'))
+        response = StreamingHttpResponse(export_courses(courses),
+                                         content_type='application/jsonl')
+        response['Content-Disposition'] = 'attachment; filename="courses.jsonl"'
+        return response
+
+    @action(detail=False,
+            methods=['post'],
+            url_path='import',
+            permission_classes=[IsAdminUser])
+    def import_archive(self, request, *args, **kwargs):
+        if request.stream is None:
+            return Response({'error': 'Empty archive.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        # read the archive line by line from the request body
+        lines = iter(request.stream.readline, b'')
+        try:
+            stats = import_courses(lines)
+        except ArchiveError as e:
+            return Response({'error': str(e)},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(stats, status=status.HTTP_201_CREATED)
+
+
+class TokenView(APIView):
+    """
+    Exchanges Basic credentials for a signed token.
+    """
+    authentication_classes = [BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, format=None):
+        return Response({'token': issue_token(request.user),
+                         'expires_in': TOKEN_MAX_AGE})
+
+
+content_range_re = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class UploadView(APIView):
+    """
+    Starts a chunked upload of the file of a File or Image item.
+    """
+    authentication_classes = API_AUTHENTICATION
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, format=None):
+        serializer = UploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        if not request.user.has_perm(f'courses.add_{data["model"]}'):
+            raise PermissionDenied()
+        try:
+            upload = start_upload(request.user, data['model'],
+                                  data['filename'], data['size'],
+                                  data['sha256'])
+        except UploadError as e:
+            return Response({'error': str(e)},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(UploadSerializer(upload).data,
+                        status=status.HTTP_201_CREATED)
+
+
+class UploadDetailView(APIView):
+    """
+    GET reports how far an upload got, PUT appends a chunk to it
+    and DELETE abandons it.
+
+    Chunks are raw request bodies with a
+    ``Content-Range: bytes <first>-<last>/<size>`` header; ``first``
+    must be the upload's current ``offset``.
+    """
+    authentication_classes = API_AUTHENTICATION
+    permission_classes = [IsAuthenticated]
+
+    def get_upload(self, request, pk):
+        return get_object_or_404(Upload, pk=pk, owner=request.user)
+
+    def get(self, request, pk, format=None):
+        return Response(UploadSerializer(self.get_upload(request, pk)).data)
+
+    def put(self, request, pk, format=None):
+        upload = self.get_upload(request, pk)
+        match = content_range_re.match(request.headers.get('Content-Range', ''))
+        if (not match or int(match[3]) != upload.size
+                or int(match[2]) < int(match[1])):
+            return Response({'error': 'Invalid Content-Range.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        first, last = int(match[1]), int(match[2])
+        try:
+            # the body is read straight from the request stream
+            write_chunk(upload, first, last - first + 1, request.stream)
+        except OffsetMismatch as e:
+            return Response({'error': str(e), 'offset': upload.offset},
+                            status=status.HTTP_409_CONFLICT)
+        except UploadError as e:
+            return Response({'error': str(e)},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(UploadSerializer(upload).data)
+
+    def delete(self, request, pk, format=None):
+        discard_upload(self.get_upload(request, pk))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UploadCompleteView(APIView):
+    """
+    Verifies a fully received upload and creates its item, with the
+    given ``title``, appended to the contents of ``module`` if given.
+    """
+    authentication_classes = API_AUTHENTICATION
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk, format=None):
+        upload = get_object_or_404(Upload, pk=pk, owner=request.user)
+        title = request.data.get('title') or upload.filename
+        module = None
+        if request.data.get('module') is not None:
+            module = get_object_or_404(Module, pk=request.data['module'],
+                                       course__owner=request.user)
+        try:
+            item = complete_upload(upload, title, module=module)
+        except UploadError as e:
+            return Response({'error': str(e)},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response({'model': item._meta.model_name, 'id': item.id,
+                         'title': item.title},
+                        status=status.HTTP_201_CREATED)
+
+
+class CourseSearchPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class CourseSearchView(generics.ListAPIView):
+    """
+    Courses matching the ``q`` parameter, best matches first.
+    """
+    serializer_class = CourseSearchSerializer
+    pagination_class = CourseSearchPagination
+
+    def get_queryset(self):
+        query = self.request.query_params.get('q', '').strip()
+        if not query:
+            return Course.objects.none()
+        return search_courses(query)
 
 
 class SubjectListView(generics.ListAPIView):
     queryset = Subject.objects.all()
     serializer_class = SubjectSerializer
+    pagination_class = SubjectCursorPagination
 
 
 class SubjectDetailView(generics.RetrieveAPIView):
     queryset = Subject.objects.all()
     serializer_class = SubjectSerializer
 
+    @method_decorator(cache_for_anonymous)
+    @method_decorator(condition(etag_func=api_subject_etag,
+                                last_modified_func=api_subject_last_modified))
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
 
 class CourseEnrollView(APIView):
-    authentication_classes = [BasicAuthentication]
+    authentication_classes = API_AUTHENTICATION
     permission_classes = [IsAuthenticated]
 
     def post(self, request, pk, format=None):
@@ -0,0 +1,258 @@
+"""
+Course archives: a JSON-lines export of the
+Subject -> Course -> Module -> Content -> item tree.
+
+Each line is one record with a ``type`` of ``subject``, ``course``,
+``module`` or ``content``. A record always comes after the records it
+refers to. Users are referred to by username, subjects and courses by
+slug, and modules by a ``key`` local to the archive. File and image items
+carry the storage name of their file, not its bytes: the media files
+are expected to be copied alongside the archive.
+
+Imports are all-or-nothing: an invalid record rolls back the whole
+archive.
+"""
+import json
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from .catalog import bump_catalog_version
+from .loaders import with_course_contents
+from .models import Subject, Course, Module, Content
+from .search import schedule_search_update
+
+ITEM_FIELDS = {
+    'text': ['content'],
+    'video': ['url'],
+    'image': ['file'],
+    'file': ['file'],
+}
+
+
+class ArchiveError(Exception):
+    """
+    Raised when an archive can't be imported.
+    """
+
+
+def _dumps(record):
+    return json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def export_courses(queryset, chunk_size=100):
+    """
+    Yield the archive lines of the courses in ``queryset``.
+    Courses are read ``chunk_size`` at a time, with their modules,
+    contents and items prefetched per chunk, so memory stays flat
+    whatever the size of the catalog.
+    """
+    usernames = {}
+
+    def username(user_id):
+        if user_id not in usernames:
+            usernames[user_id] = User.objects.values_list(
+                'username', flat=True).get(pk=user_id)
+        return usernames[user_id]
+
+    subjects = set()
+    queryset = with_course_contents(
+        queryset.select_related('subject', 'owner').order_by('pk'))
+    for course in queryset.iterator(chunk_size=chunk_size):
+        usernames[course.owner_id] = course.owner.username
+        if course.subject_id not in subjects:
+            subjects.add(course.subject_id)
+            yield _dumps({'type': 'subject',
+                          'title': course.subject.title,
+                          'slug': course.subject.slug})
+        yield _dumps({'type': 'course',
+                      'subject': course.subject.slug,
+                      'owner': course.owner.username,
+                      'title': course.title,
+                      'slug': course.slug,
+                      'overview': course.overview})
+        for module in course.modules.all():
+            yield _dumps({'type': 'module',
+                          'key': module.pk,
+                          'course': course.slug,
+                          'title': module.title,
+                          'description': module.description,
+                          'order': module.order})
+            for content in module.contents.all():
+                item = content.item
+                if item is None:
+                    continue
+                model_name = item._meta.model_name
+                data = {'owner': username(item.owner_id),
+                        'title': item.title}
+                for field in ITEM_FIELDS[model_name]:
+                    value = getattr(item, field)
+                    data[field] = getattr(value, 'name', value)
+                yield _dumps({'type': 'content',
+                              'module': module.pk,
+                              'order': content.order,
+                              'model': model_name,
+                              'item': data})
+
+
+class CourseImporter:
+    """
+    Reads archive lines and writes them with one ``bulk_create``
+    per model for every batch of ``batch_size`` courses.
+    Courses whose slug already exists are skipped, with their
+    modules and contents.
+    """
+
+    def __init__(self, batch_size=100):
+        self.batch_size = batch_size
+        self.stats = {'subjects': 0, 'courses': 0, 'modules': 0,
+                      'contents': 0, 'skipped': 0}
+        self.subjects = {}
+        self.users = {}
+        self.skipped = set()
+        self._reset()
+
+    def _reset(self):
+        self.courses = []
+        self.modules = []
+        self.contents = []
+        # what records of the current batch may refer to
+        self.course_slugs = set()
+        self.module_keys = set()
+
+    def _user(self, username):
+        if username not in self.users:
+            try:
+                self.users[username] = User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise ArchiveError(f'Unknown user "{username}".')
+        return self.users[username]
+
+    def _subject(self, slug):
+        try:
+            return self.subjects[slug]
+        except KeyError:
+            raise ArchiveError(f'Unknown subject "{slug}".')
+
+    def read(self, lines):
+        for number, line in enumerate(lines, 1):
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                kind = record.pop('type')
+            except (ValueError, KeyError, AttributeError, TypeError):
+                raise ArchiveError(f'Line {number}: invalid record.')
+            if kind == 'course' and len(self.courses) >= self.batch_size:
+                self.flush()
+            handler = getattr(self, f'read_{kind}', None)
+            if handler is None:
+                raise ArchiveError(f'Line {number}: unknown type "{kind}".')
+            try:
+                handler(record)
+            except ArchiveError as e:
+                raise ArchiveError(f'Line {number}: {e}')
+            except (KeyError, TypeError, ValueError):
+                raise ArchiveError(f'Line {number}: invalid {kind} record.')
+        self.flush()
+        if self.stats['courses']:
+            # bulk_create() sends no signals
+            bump_catalog_version()
+        return self.stats
+
+    def read_subject(self, record):
+        subject, created = Subject.objects.get_or_create(
+            slug=record['slug'], defaults={'title': record['title']})
+        self.subjects[subject.slug] = subject
+        self.stats['subjects'] += created
+
+    def read_course(self, record):
+        course = Course(subject=self._subject(record['subject']),
+                        owner=self._user(record['owner']),
+                        title=record['title'],
+                        slug=record['slug'],
+                        overview=record['overview'])
+        if course.slug in self.course_slugs:
+            raise ArchiveError(f'Duplicate course "{course.slug}".')
+        self.courses.append(course)
+        self.course_slugs.add(course.slug)
+
+    def read_module(self, record):
+        if record['course'] not in self.course_slugs:
+            raise ArchiveError(f'Unknown course "{record["course"]}".')
+        if record['key'] in self.module_keys:
+            raise ArchiveError(f'Duplicate module key "{record["key"]}".')
+        self.module_keys.add(record['key'])
+        self.modules.append((record['course'], record['key'],
+                             Module(title=record['title'],
+                                    description=record['description'],
+                                    order=record.get('order'))))
+
+    def read_content(self, record):
+        model_name = record['model']
+        if model_name not in ITEM_FIELDS:
+            raise ArchiveError(f'Unknown content model "{model_name}".')
+        if record['module'] not in self.module_keys:
+            raise ArchiveError(f'Unknown module "{record["module"]}".')
+        data = record['item']
+        model = apps.get_model('courses', model_name)
+        item = model(owner=self._user(data['owner']), title=data['title'],
+                     **{field: data[field]
+                        for field in ITEM_FIELDS[model_name]})
+        self.contents.append((record['module'],
+                              Content(order=record.get('order')), item))
+
+    @transaction.atomic
+    def flush(self):
+        existing = set(Course.objects.filter(
+            slug__in=[course.slug for course in self.courses]
+        ).values_list('slug', flat=True))
+        courses = {course.slug: course for course in self.courses
+                   if course.slug not in existing}
+        self.skipped |= existing
+        self.stats['skipped'] += len(existing)
+        Course.objects.bulk_create(courses.values())
+
+        modules = {}
+        for course_slug, key, module in self.modules:
+            if course_slug in self.skipped:
+                continue
+            module.course = courses[course_slug]
+            modules[key] = module
+        Module._meta.get_field('order').allocate(modules.values())
+        Module.objects.bulk_create(modules.values())
+
+        contents = [(modules[key], content, item)
+                    for key, content, item in self.contents
+                    if key in modules]
+        by_model = {}
+        for _, _, item in contents:
+            by_model.setdefault(type(item), []).append(item)
+        for model, items in by_model.items():
+            model.objects.bulk_create(items)
+        content_types = ContentType.objects.get_for_models(*by_model)
+        for module, content, item in contents:
+            content.module = module
+            content.content_type = content_types[type(item)]
+            content.object_id = item.pk
+        contents = [content for _, content, _ in contents]
+        Content._meta.get_field('order').allocate(contents)
+        Content.objects.bulk_create(contents)
+        # bulk_create() sends no signals
+        schedule_search_update([course.pk for course in courses.values()])
+
+        self.stats['courses'] += len(courses)
+        self.stats['modules'] += len(modules)
+        self.stats['contents'] += len(contents)
+        self._reset()
+
+
+@transaction.atomic
+def import_courses(lines, batch_size=100):
+    """
+    Import the courses of an archive from an iterable of lines, in a
+    single transaction. Return counts of the created and skipped objects.
+    """
+    return CourseImporter(batch_size=batch_size).read(lines)
@@ -0,0 +1,112 @@
+"""
+Cache of the public course catalog.
+
+Subjects and courses are cached as evaluated, compact row tuples.
+Keys embed the catalog version (see ``courses.versioning``): any write
+to a Subject, Course or Module bumps it instead of deleting keys, and
+the old entries simply expire.
+"""
+from collections import namedtuple
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Value
+from django.db.models.functions import Concat, Trim
+from .models import Subject, Course
+from .versioning import CATALOG, bump, get_version
+
+CATALOG_CACHE_TIMEOUT = getattr(settings, 'CATALOG_CACHE_TIMEOUT',
+                                60 * 60 * 24)
+
+SubjectRow = namedtuple('SubjectRow', ['id', 'title', 'slug',
+                                       'total_courses'])
+CourseRow = namedtuple('CourseRow', ['id', 'title', 'slug',
+                                     'subject_title', 'subject_slug',
+                                     'owner_name', 'total_modules'])
+
+
+def catalog_version():
+    return get_version(CATALOG)
+
+
+def bump_catalog_version():
+    bump(CATALOG)
+
+
+def _cached(name, build):
+    key = f'catalog:{catalog_version()}:{name}'
+    rows = cache.get(key)
+    if rows is None:
+        # empty results are cached too
+        rows = build()
+        cache.set(key, rows, CATALOG_CACHE_TIMEOUT)
+    return rows
+
+
+def _build_subjects():
+    return tuple(SubjectRow(*row) for row in Subject.objects.annotate(
+        total_courses=Count('courses')
+    ).values_list('id', 'title', 'slug', 'total_courses'))
+
+
+def _build_courses(subject_id=None):
+    # subject and instructor come from the same query as the module count
+    qs = Course.objects.annotate(
+        total_modules=Count('modules'),
+        owner_name=Trim(Concat('owner__first_name', Value(' '),
+                               'owner__last_name')))
+    if subject_id is not None:
+        qs = qs.filter(subject_id=subject_id)
+    return tuple(CourseRow(*row) for row in qs.values_list(
+        'id', 'title', 'slug', 'subject__title', 'subject__slug',
+        'owner_name', 'total_modules'))
+
+
+def get_subjects():
+    """
+    All subjects with their number of courses.
+    """
+    return _cached('subjects', _build_subjects)
+
+
+def get_subject(slug):
+    """
+    The subject row with the given slug, or None.
+    """
+    for subject in get_subjects():
+        if subject.slug == slug:
+            return subject
+    return None
+
+
+def get_courses(subject_id=None):
+    """
+    All courses, or the courses of one subject, with their
+    number of modules.
+    """
+    name = 'courses' if subject_id is None else f'courses:{subject_id}'
+    return _cached(name, lambda: _build_courses(subject_id))
+
+
+def course_slug_key(slug):
+    return f'course_slug:{slug}'
+
+
+def get_course_id(slug):
+    """
+    Return the id of the course with the given slug, or None.
+    """
+    course_id = cache.get(course_slug_key(slug))
+    if course_id is None:
+        course_id = Course.objects.filter(slug=slug).values_list(
+            'pk', flat=True).first()
+        if course_id is not None:
+            cache.set(course_slug_key(slug), course_id, CATALOG_CACHE_TIMEOUT)
+    return course_id
+
+
+def remember_course_slug(course):
+    cache.set(course_slug_key(course.slug), course.pk, CATALOG_CACHE_TIMEOUT)
+
+
+def forget_course_slug(course):
+    cache.delete(course_slug_key(course.slug))
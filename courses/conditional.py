@@ -0,0 +1,100 @@
+"""
+Conditional GET and cache headers for the catalog pages and the
+courses API.
+
+ETags come from the versions of ``courses.versioning``, so a 304 costs a cache lookup and no rendering or
+serialization. HTML pages vary with the user, whose id and CSRF state
+are part of the ETag; API representations vary with the ``Accept``
+header.
+
+Settings:
+
+* ``CATALOG_MAX_AGE``: seconds browsers may reuse an anonymous page.
+* ``CATALOG_CDN_MAX_AGE``: seconds shared caches may reuse it.
+"""
+import hashlib
+import zlib
+from datetime import datetime, timezone
+from functools import wraps
+from django.conf import settings
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_cache_control
+from .catalog import catalog_version, get_course_id
+from .versioning import COURSE, SUBJECT, get_version, last_changed
+
+MAX_AGE = getattr(settings, 'CATALOG_MAX_AGE', 60)
+CDN_MAX_AGE = getattr(settings, 'CATALOG_CDN_MAX_AGE', 300)
+
+
+def _user_part(request):
+    """
+    Pages of signed-in users embed their CSRF token, which changes with
+    every login: their ETag follows the CSRF secret and session.
+    """
+    if not request.user.is_authenticated:
+        return 0
+    # set the CSRF cookie now if the page is the first to need it
+    get_token(request)
+    state = (f'{request.META.get("CSRF_COOKIE", "")}:'
+             f'{request.session.session_key}')
+    return f'{request.user.pk}-{hashlib.md5(state.encode()).hexdigest()[:12]}'
+
+
+def _accept_part(request):
+    return zlib.crc32(request.META.get('HTTP_ACCEPT', '').encode())
+
+
+def _datetime(stamp):
+    return datetime.fromtimestamp(stamp, tz=timezone.utc)
+
+
+def catalog_etag(request, subject=None):
+    return f'catalog-{catalog_version()}-{_user_part(request)}'
+
+
+def course_page_etag(request, slug):
+    course_id = get_course_id(slug)
+    if course_id is None:
+        return None
+    return (f'course-{course_id}-{get_version(COURSE, course_id)}-'
+            f'{_user_part(request)}')
+
+
+def api_catalog_etag(request, *args, **kwargs):
+    return f'catalog-{catalog_version()}-{_accept_part(request)}'
+
+
+def api_course_etag(request, pk):
+    return (f'course-{pk}-{get_version(COURSE, pk)}-'
+            f'{_accept_part(request)}')
+
+
+def api_course_last_modified(request, pk):
+    return _datetime(last_changed(COURSE, pk))
+
+
+def api_subject_etag(request, pk):
+    return (f'subject-{pk}-{get_version(SUBJECT, pk)}-'
+            f'{_accept_part(request)}')
+
+
+def api_subject_last_modified(request, pk):
+    return _datetime(last_changed(SUBJECT, pk))
+
+
+def cache_for_anonymous(view):
+    """
+    Let browsers and CDNs reuse the responses served to anonymous
+    users for a while; others must always revalidate.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True, max_age=0,
+                                must_revalidate=True)
+        else:
+            patch_cache_control(response, public=True, max_age=MAX_AGE,
+                                s_maxage=CDN_MAX_AGE)
+        return response
+    return wrapper
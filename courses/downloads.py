@@ -0,0 +1,118 @@
+"""
+Efficient delivery of the files of File and Image items.
+
+Files are either handed to the web server (``X-Accel-Redirect`` for
+nginx, ``X-Sendfile`` for Apache) or streamed by Django with support for
+single-range ``Range`` requests, so interrupted downloads resume and
+PDF viewers can fetch pages on demand.
+
+Settings:
+
+* ``COURSE_FILES_OFFLOAD``: ``'x-accel'``, ``'x-sendfile'`` or None.
+* ``COURSE_FILES_ACCEL_PREFIX``: internal nginx location mapped to
+  ``MEDIA_ROOT``, e.g. ``'/protected-media/'``.
+"""
+import mimetypes
+import re
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+OFFLOAD = getattr(settings, 'COURSE_FILES_OFFLOAD', None)
+ACCEL_PREFIX = getattr(settings, 'COURSE_FILES_ACCEL_PREFIX',
+                       '/protected-media/')
+CHUNK_SIZE = 64 * 1024
+
+range_re = re.compile(r'^\s*bytes=(\d*)-(\d*)\s*$')
+
+
+def parse_range(header, size):
+    """
+    Return the ``(start, end)`` byte positions requested by a single
+    range header, None to send the whole file, or ``False`` if the
+    range can't be satisfied.
+    """
+    match = range_re.match(header or '')
+    if not match:
+        # absent, malformed or multi-range: send everything
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def range_is_current(request, etag, last_modified):
+    """
+    Apply ``If-Range``: ranges only apply to the same version.
+    """
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return etag in parse_etags(if_range)
+    date = parse_http_date_safe(if_range)
+    return date is not None and date >= int(last_modified.timestamp())
+
+
+def _read_range(f, start, length):
+    try:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        f.close()
+
+
+def file_response(request, field_file, etag, last_modified):
+    """
+    Build the response serving ``field_file``.
+    """
+    content_type = (mimetypes.guess_type(field_file.name)[0]
+                    or 'application/octet-stream')
+    if OFFLOAD == 'x-accel':
+        # nginx serves the file, ranges included
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = ACCEL_PREFIX + field_file.name
+    elif OFFLOAD == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = field_file.path
+    else:
+        size = field_file.size
+        byte_range = None
+        if range_is_current(request, etag, last_modified):
+            byte_range = parse_range(request.headers.get('Range'), size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+        elif byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                _read_range(field_file.open('rb'), start, length),
+                status=206, content_type=content_type)
+            response['Content-Length'] = str(length)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        else:
+            # FileResponse uses the server's sendfile wrapper if any
+            response = FileResponse(field_file.open('rb'),
+                                    content_type=content_type)
+        response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified.timestamp())
+    response['Cache-Control'] = 'private, max-age=0, must-revalidate'
+    return response
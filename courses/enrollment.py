@@ -0,0 +1,30 @@
+"""
+Bulk enrollment of students in courses.
+"""
+from .membership import invalidate_enrollments
+from .models import Course
+
+Enrollment = Course.students.through
+
+
+def bulk_enroll(course_ids, user_ids):
+    """
+    Enroll every user in every course with a single
+    ``bulk_create(ignore_conflicts=True)``. Return the set of
+    ``(course_id, user_id)`` pairs that were not enrolled before.
+    """
+    pairs = {(course_id, user_id)
+             for course_id in course_ids for user_id in user_ids}
+    if not pairs:
+        return set()
+    existing = set(Enrollment.objects.filter(
+        course_id__in=course_ids, user_id__in=user_ids
+    ).values_list('course_id', 'user_id'))
+    created = pairs - existing
+    Enrollment.objects.bulk_create(
+        [Enrollment(course_id=course_id, user_id=user_id)
+         for course_id, user_id in created],
+        ignore_conflicts=True)
+    # bulk_create() sends no m2m_changed signal
+    invalidate_enrollments({user_id for _, user_id in created})
+    return created
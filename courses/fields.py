@@ -1,34 +1,87 @@
-from django.db import models
-from django.core.exceptions import ObjectDoesNotExist
+from functools import reduce
+from operator import or_
+from django.db import models, router, transaction
+from django.db.models import Max, Q
 
 
 class OrderField(models.PositiveIntegerField):
     """
     Model field for defining the order of objects.
+
+    New values are ``MAX(order) + 1`` among the objects sharing the
+    values of the fields in ``for_fields``. Inside a transaction the
+    parent rows those fields point to are locked first, so concurrent
+    inserts under the same parent get distinct positions.
     """
 
     def __init__(self, for_fields=None, *args, **kwargs):
         self.for_fields = for_fields
         super().__init__(*args, **kwargs)
 
+    def _for_attnames(self):
+        return [self.model._meta.get_field(field).attname
+                for field in self.for_fields or []]
+
+    def _lock_parents(self, keys, using):
+        """
+        Lock the rows referenced by the ``for_fields`` foreign keys
+        until the end of the current transaction.
+        """
+        if not transaction.get_connection(using).in_atomic_block:
+            return
+        for index, field in enumerate(self.for_fields or []):
+            field = self.model._meta.get_field(field)
+            if not field.is_relation:
+                continue
+            pks = {key[index] for key in keys}
+            list(field.related_model._base_manager.using(using)
+                 .select_for_update().filter(pk__in=pks)
+                 .order_by('pk').values_list('pk', flat=True))
+
+    def _last_values(self, keys, using):
+        """
+        Return the highest current value for each group of
+        ``for_fields`` values, in a single query.
+        """
+        attnames = self._for_attnames()
+        self._lock_parents(keys, using)
+        qs = self.model._base_manager.using(using)
+        if not attnames:
+            return {(): qs.aggregate(last=Max(self.attname))['last']}
+        qs = qs.filter(reduce(or_, (Q(**dict(zip(attnames, key)))
+                                    for key in keys)))
+        rows = qs.order_by().values(*attnames).annotate(
+            last=Max(self.attname))
+        return {tuple(row[name] for name in attnames): row['last']
+                for row in rows}
+
+    def allocate(self, instances, using=None):
+        """
+        Assign consecutive values to the given unsaved instances that
+        have none yet, with one query for all of them. Use it before
+        ``bulk_create()``, inside a transaction.
+        """
+        attnames = self._for_attnames()
+        pending = [instance for instance in instances
+                   if getattr(instance, self.attname) is None]
+        if not pending:
+            return
+        using = using or router.db_for_write(self.model)
+        keys = {tuple(getattr(instance, name) for name in attnames)
+                for instance in pending}
+        last_values = self._last_values(keys, using)
+        for instance in pending:
+            key = tuple(getattr(instance, name) for name in attnames)
+            last = last_values.get(key)
+            value = 0 if last is None else last + 1
+            setattr(instance, self.attname, value)
+            last_values[key] = value
+
     def pre_save(self, model_instance, add):
         if getattr(model_instance, self.attname) is None:
             # no current value
-            try:
-                qs = self.model.objects.all()
-                if self.for_fields:
-                    # filter objects with the same field values
-                    # for the fields in "for_fields"
-                    query = {
-                        field: getattr(model_instance, field) for field in self.for_fields
-                    }
-                    qs = qs.filter(**query)
-                # get the order of the last item
-                last_item = qs.latest(self.attname)
-                value = last_item.order + 1
-            except ObjectDoesNotExist:
-                value = 0
-            setattr(model_instance, self.attname, value)
-            return value
+            self.allocate([model_instance],
+                          using=model_instance._state.db)
+            return getattr(model_instance, self.attname)
         else:
             return super().pre_save(model_instance, add)
@@ -0,0 +1,101 @@
+"""
+Resized WebP variants of Image items.
+
+Variants are generated by a small thread pool once the saving
+transaction commits, off the request path. Their storage names are
+written to ``Image.variants`` and served through ContentFileView with
+``?w=<width>``; the image template emits them as a ``srcset``.
+"""
+import io
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image as PILImage
+from .models import Image
+
+logger = logging.getLogger(__name__)
+
+VARIANT_WIDTHS = getattr(settings, 'IMAGE_VARIANT_WIDTHS', (320, 640, 1280))
+VARIANT_QUALITY = getattr(settings, 'IMAGE_VARIANT_QUALITY', 80)
+
+executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'IMAGE_VARIANT_WORKERS', 2),
+    thread_name_prefix='image-variants')
+
+
+def variant_name(name, width):
+    stem = posixpath.splitext(posixpath.basename(name))[0]
+    return f'images/variants/{stem}-{width}.webp'
+
+
+def delete_variants(storage, variants):
+    for name in variants.get('widths', {}).values():
+        storage.delete(name)
+
+
+def make_variants(image):
+    """
+    Write the variants of an image narrower than the original and
+    return the new value of ``image.variants``.
+    """
+    storage = image.file.storage
+    with image.file.open('rb') as f:
+        original = PILImage.open(f)
+        original.load()
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA')
+    widths = {}
+    for width in VARIANT_WIDTHS:
+        if width >= original.width:
+            break
+        variant = original.copy()
+        variant.thumbnail((width, original.height))
+        buffer = io.BytesIO()
+        variant.save(buffer, 'WEBP', quality=VARIANT_QUALITY)
+        widths[str(width)] = storage.save(variant_name(image.file.name, width),
+                                          ContentFile(buffer.getvalue()))
+    return {'source': image.file.name, 'widths': widths}
+
+
+def generate_variants(image_id):
+    """
+    Generate the variants of an image; runs in the worker pool.
+    """
+    from .signals import item_changed
+    close_old_connections()
+    try:
+        image = Image.objects.get(pk=image_id)
+        variants = make_variants(image)
+        # skip the update if the file changed meanwhile; bumping
+        # ``updated`` moves the render cache key
+        now = timezone.now()
+        updated = Image.objects.filter(
+            pk=image.pk, file=image.file.name).update(variants=variants,
+                                                      updated=now)
+        if not updated:
+            delete_variants(image.file.storage, variants)
+            return
+        delete_variants(image.file.storage, image.variants)
+        image.variants = variants
+        image.updated = now
+        item_changed(Image, image)
+    except Image.DoesNotExist:
+        pass
+    except Exception:
+        logger.exception('Could not generate variants of image %s', image_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_variants(image):
+    """
+    Generate the variants of the image after the current transaction
+    commits, unless they are up to date.
+    """
+    if image.file and image.variants.get('source') != image.file.name:
+        transaction.on_commit(
+            lambda: executor.submit(generate_variants, image.pk))
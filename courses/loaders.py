@@ -0,0 +1,42 @@
+"""
+Batched loaders for module contents.
+
+``Content.item`` is a generic foreign key, so touching it row by row
+costs one query per item. These helpers prefetch every item of a module
+(or of a whole course) with one query per concrete item model
+(Text, Video, Image, File), whatever the number of contents.
+"""
+from django.db.models import Prefetch, prefetch_related_objects
+from .models import Module, Content
+
+
+def contents_queryset():
+    """
+    Contents with their generic items prefetched.
+    """
+    return Content.objects.prefetch_related('item')
+
+
+def modules_queryset():
+    """
+    Modules with their contents and items prefetched.
+    """
+    return Module.objects.prefetch_related(
+        Prefetch('contents', queryset=contents_queryset()))
+
+
+def prefetch_module_contents(*modules):
+    """
+    Load the contents and items of the given modules in bulk,
+    so ``module.contents.all`` and ``content.item`` hit no database.
+    """
+    prefetch_related_objects(
+        list(modules), Prefetch('contents', queryset=contents_queryset()))
+
+
+def with_course_contents(queryset):
+    """
+    Add the module/content/item prefetches to a Course queryset.
+    """
+    return queryset.prefetch_related(
+        Prefetch('modules', queryset=modules_queryset()))
@@ -0,0 +1,15 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from courses.uploads import clear_stale_uploads
+
+
+class Command(BaseCommand):
+    help = 'Discard chunked uploads that stopped progressing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24,
+                            help='Age of the last chunk, in hours.')
+
+    def handle(self, *args, **options):
+        count = clear_stale_uploads(timedelta(hours=options['hours']))
+        self.stdout.write(f'Discarded {count} uploads.')
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from courses.archive import export_courses
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = 'Stream courses to a JSON-lines archive.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subject', action='append', default=[],
+                            help='Only export the courses of this subject slug.')
+        parser.add_argument('--course', action='append', default=[],
+                            help='Only export the course with this slug.')
+        parser.add_argument('-o', '--output',
+                            help='Archive file; defaults to stdout.')
+        parser.add_argument('--chunk-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        courses = Course.objects.all()
+        if options['subject']:
+            courses = courses.filter(subject__slug__in=options['subject'])
+        if options['course']:
+            courses = courses.filter(slug__in=options['course'])
+        lines = export_courses(courses, chunk_size=options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,27 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from courses.archive import ArchiveError, import_courses
+
+
+class Command(BaseCommand):
+    help = 'Import courses from a JSON-lines archive.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archive',
+                            help='Archive file, or "-" to read stdin.')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Courses written per bulk insert.')
+
+    def handle(self, *args, **options):
+        try:
+            if options['archive'] == '-':
+                stats = import_courses(sys.stdin, options['batch_size'])
+            else:
+                with open(options['archive'], encoding='utf-8') as f:
+                    stats = import_courses(f, options['batch_size'])
+        except (OSError, ArchiveError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            'Imported {subjects} subjects, {courses} courses, '
+            '{modules} modules and {contents} contents; '
+            'skipped {skipped} existing courses.'.format(**stats)))
@@ -0,0 +1,38 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from courses.models import Video
+from courses.videos import fetch_metadata, store_metadata
+
+
+class Command(BaseCommand):
+    help = 'Resolve the provider metadata of videos in bulk.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Refresh every video, not only those '
+                                 'with missing or outdated metadata.')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Concurrent requests to the providers.')
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        videos = Video.objects.only('id', 'url', 'metadata', 'updated')
+        total = 0
+        batch = []
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for video in videos.iterator(chunk_size=options['batch_size']):
+                metadata = video.metadata
+                if (options['all'] or metadata.get('source') != video.url
+                        or 'error' in metadata):
+                    batch.append(video)
+                if len(batch) >= options['batch_size']:
+                    total += self.refresh(pool, batch)
+                    batch = []
+            total += self.refresh(pool, batch)
+        self.stdout.write(f'Refreshed {total} videos.')
+
+    def refresh(self, pool, videos):
+        urls = [video.url for video in videos]
+        for video, metadata in zip(videos, pool.map(fetch_metadata, urls)):
+            video.metadata = metadata
+        return len(store_metadata(videos))
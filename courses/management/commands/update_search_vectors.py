@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from courses.models import Course
+from courses.search import search_enabled, update_search_vectors
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search vectors of courses.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if not search_enabled():
+            raise CommandError('Full-text search requires PostgreSQL.')
+        course_ids = list(Course.objects.values_list('pk', flat=True))
+        size = options['batch_size']
+        for start in range(0, len(course_ids), size):
+            update_search_vectors(course_ids[start:start + size])
+        self.stdout.write(f'Updated {len(course_ids)} courses.')
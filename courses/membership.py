@@ -0,0 +1,48 @@
+"""
+Cached set of the courses each user is enrolled in.
+
+Membership checks become a set lookup on the cached ids instead of a
+join on the enrollment table. The cached set is dropped whenever the
+user's enrollments change and reloaded from the database on a miss.
+"""
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from .models import Course
+
+ENROLLMENT_CACHE_TIMEOUT = getattr(settings, 'ENROLLMENT_CACHE_TIMEOUT',
+                                   60 * 60 * 24)
+
+
+def enrolled_courses_key(user_id):
+    return f'user_courses_joined:{user_id}'
+
+
+def enrolled_course_ids(user):
+    """
+    Return the frozenset of ids of the courses the user joined.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    key = enrolled_courses_key(user.pk)
+    course_ids = cache.get(key)
+    if course_ids is None:
+        course_ids = frozenset(Course.students.through.objects.filter(
+            user_id=user.pk).values_list('course_id', flat=True))
+        cache.set(key, course_ids, ENROLLMENT_CACHE_TIMEOUT)
+    return course_ids
+
+
+def is_enrolled(user, course_id):
+    try:
+        return int(course_id) in enrolled_course_ids(user)
+    except (TypeError, ValueError):
+        return False
+
+
+ais_enrolled = database_sync_to_async(is_enrolled)
+
+
+def invalidate_enrollments(user_ids):
+    if user_ids:
+        cache.delete_many([enrolled_courses_key(pk) for pk in user_ids])
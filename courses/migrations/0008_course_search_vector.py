@@ -0,0 +1,41 @@
+# Generated by Django 5.0.1 on 2026-10-18 10:57
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class AddPostgresIndex(migrations.AddIndex):
+    """
+    GIN indexes only exist on PostgreSQL; other databases,
+    e.g. SQLite in tests, skip the index.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor,
+                                      from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor,
+                                       from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0007_video_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        AddPostgresIndex(
+            model_name='course',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='courses_cou_search__e2a3ab_gin'),
+        ),
+    ]
@@ -1,13 +1,22 @@
 """
 Models for Courses application.
 """
+import uuid
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.core.cache import cache
 from django.db import models
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.template.loader import render_to_string
+from django.urls import reverse
 from .fields import OrderField
 
+ITEM_RENDER_CACHE_TIMEOUT = getattr(settings, 'ITEM_RENDER_CACHE_TIMEOUT',
+                                    60 * 60 * 24)
+
 
 class Subject(models.Model):
     """
@@ -42,9 +51,12 @@ class Course(models.Model):
     students = models.ManyToManyField(User,
                                       related_name="courses_joined",
                                       blank=True)
+    # maintained by courses.search on PostgreSQL
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         ordering = ["-created"]
+        indexes = [GinIndex(fields=["search_vector"])]
 
     def __str__(self):
         return str(self.title)
@@ -104,10 +116,34 @@ class ItemBase(models.Model):
     def __str__(self):
         return str(self.title)
 
-    def render(self):
+    @property
+    def render_cache_key(self):
+        """
+        Cache key of the rendered HTML; it changes whenever
+        the item is saved, since ``updated`` is bumped.
+        """
+        return (f'item_render:{self._meta.label_lower}:{self.pk}:'
+                f'{self.updated.timestamp()}')
+
+    def render_uncached(self):
         return render_to_string(f'courses/content/{self._meta.model_name}.html',
                                 {'item': self})
 
+    def render(self):
+        """
+        Return the rendered HTML, from the instance, then the cache,
+        and only render the template on a miss.
+        """
+        html = getattr(self, '_rendered', None)
+        if html is None:
+            html = cache.get(self.render_cache_key)
+            if html is None:
+                html = self.render_uncached()
+                cache.set(self.render_cache_key, html,
+                          ITEM_RENDER_CACHE_TIMEOUT)
+            self._rendered = html
+        return html
+
 
 class Text(ItemBase):
     """
@@ -126,13 +162,53 @@ class File(ItemBase):
 class Image(ItemBase):
     """
     To store image files.
+    Resized WebP variants are generated in the background;
+    ``variants`` holds the name of the ``source`` file they were made
+    from and maps their ``widths`` to their storage names.
     """
     file = models.FileField(upload_to="images")
+    variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    @property
+    def srcset(self):
+        url = reverse('courses:content_file', args=['image', self.id])
+        widths = self.variants.get('widths', {})
+        return ', '.join(f'{url}?w={width} {width}w'
+                         for width in sorted(widths, key=int))
 
 
 class Video(ItemBase):
     """
     To store video files;
     URLField to store video URL in order to allow embedding.
+    ``metadata`` caches what the provider says about the video,
+    including the embed HTML, so rendering never calls out.
     """
     url = models.URLField()
+    metadata = models.JSONField(default=dict, blank=True, editable=False)
+
+
+class Upload(models.Model):
+    """
+    A chunked upload of the file of a File or Image item, in progress.
+    The chunks are written in place into a temporary file that becomes
+    the item's file once complete.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4,
+                          editable=False)
+    owner = models.ForeignKey(
+        User, related_name="uploads", on_delete=models.CASCADE
+    )
+    model = models.CharField(max_length=10, choices=[('file', 'File'),
+                                                     ('image', 'Image')])
+    filename = models.CharField(max_length=250)
+    size = models.PositiveBigIntegerField()
+    # bytes received so far; chunks must start there
+    offset = models.PositiveBigIntegerField(default=0)
+    # expected SHA-256 hex digest of the whole file
+    sha256 = models.CharField(max_length=64)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return str(self.filename)
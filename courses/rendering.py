@@ -0,0 +1,35 @@
+"""
+Bulk rendering of content items through the render cache.
+"""
+from django.core.cache import cache
+from .models import ITEM_RENDER_CACHE_TIMEOUT
+
+
+def render_items(items):
+    """
+    Fill the render cache of the given items with a single
+    ``get_many``; only the misses are rendered and written back
+    with one ``set_many``. ``item.render()`` is then free.
+    """
+    pending = {item.render_cache_key: item for item in items
+               if getattr(item, '_rendered', None) is None}
+    if not pending:
+        return
+    cached = cache.get_many(list(pending))
+    missing = {}
+    for key, item in pending.items():
+        html = cached.get(key)
+        if html is None:
+            html = missing[key] = item.render_uncached()
+        item._rendered = html
+    if missing:
+        cache.set_many(missing, ITEM_RENDER_CACHE_TIMEOUT)
+
+
+def render_module_items(*modules):
+    """
+    Render the items of modules whose contents are prefetched.
+    """
+    render_items(content.item for module in modules
+                 for content in module.contents.all()
+                 if content.item is not None)
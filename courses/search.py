@@ -0,0 +1,111 @@
+"""
+Full-text search over courses.
+
+On PostgreSQL every course keeps a ``search_vector`` built from its
+title (weight A), overview (B), module titles (C), and module
+descriptions and text contents (D). When the document of a course
+changes, signals rebuild its vector with a single ``UPDATE`` once the
+transaction commits. Searches use the GIN index on the vector and
+are ranked with ``ts_rank``.
+
+Other databases, e.g. SQLite in tests, fall back to unranked
+``icontains`` matching over the same fields.
+
+Settings:
+
+* ``COURSE_SEARCH_CONFIG``: the text search configuration, e.g.
+  ``'english'``.
+"""
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Q, Subquery, TextField, Value
+from django.db.models.functions import Coalesce
+from .models import Course, Module, Content, Text
+
+SEARCH_CONFIG = getattr(settings, 'COURSE_SEARCH_CONFIG', 'english')
+
+
+def search_enabled():
+    return connection.vendor == 'postgresql'
+
+
+def _joined(queryset, course_field, field):
+    """
+    Subquery joining ``field`` over the rows of ``queryset``
+    grouped by ``course_field``.
+    """
+    from django.contrib.postgres.aggregates import StringAgg
+    return Coalesce(Subquery(
+        queryset.order_by().values(course_field)
+        .annotate(joined=StringAgg(field, ' ')).values('joined')
+    ), Value(''), output_field=TextField())
+
+
+def update_search_vectors(course_ids=None):
+    """
+    Rebuild the search vectors of the given courses, or of all courses.
+    """
+    if not search_enabled():
+        return
+    from django.contrib.postgres.search import SearchVector
+    modules = Module.objects.filter(course_id=OuterRef('pk'))
+    texts = Text.objects.filter(pk=OuterRef('object_id')).values('content')
+    contents = Content.objects.filter(
+        module__course_id=OuterRef('pk'),
+        content_type=ContentType.objects.get_for_model(Text)
+    ).annotate(content_text=Subquery(texts))
+    vector = (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('overview', weight='B', config=SEARCH_CONFIG)
+        + SearchVector(_joined(modules, 'course_id', 'title'),
+                       weight='C', config=SEARCH_CONFIG)
+        + SearchVector(_joined(modules, 'course_id', 'description'),
+                       weight='D', config=SEARCH_CONFIG)
+        + SearchVector(_joined(contents, 'module__course_id', 'content_text'),
+                       weight='D', config=SEARCH_CONFIG)
+    )
+    courses = Course.objects.all()
+    if course_ids is not None:
+        courses = courses.filter(pk__in=course_ids)
+    courses.update(search_vector=vector)
+
+
+def schedule_search_update(course_ids):
+    """
+    Rebuild the vectors of the given courses once the current
+    transaction commits. ``course_ids`` may be a lazy queryset;
+    it is only evaluated when search is enabled.
+    """
+    if not search_enabled():
+        return
+    course_ids = set(course_ids)
+    if course_ids:
+        transaction.on_commit(lambda: update_search_vectors(course_ids))
+
+
+def search_courses(query, queryset=None):
+    """
+    Return the courses matching ``query``, best matches first.
+    """
+    if queryset is None:
+        queryset = Course.objects.all()
+    if search_enabled():
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+        search_query = SearchQuery(query, search_type='websearch',
+                                   config=SEARCH_CONFIG)
+        return queryset.defer('search_vector').filter(
+            search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-rank', '-created', '-id')
+    texts = Content.objects.filter(
+        content_type=ContentType.objects.get_for_model(Text),
+        object_id__in=Text.objects.filter(content__icontains=query)
+        .values('pk')).values('module__course_id')
+    matches = (Q(title__icontains=query) | Q(overview__icontains=query)
+               | Q(modules__title__icontains=query)
+               | Q(modules__description__icontains=query)
+               | Q(pk__in=texts))
+    course_ids = queryset.filter(matches).values('pk')
+    return queryset.filter(pk__in=course_ids).annotate(
+        rank=Value(0.0)).order_by('-created', '-id')
@@ -0,0 +1,187 @@
+"""
+Signal handlers keeping the course caches up to date.
+
+Cached data embeds versions (see ``courses.versioning``) that these
+handlers bump; rendered items are keyed on their ``updated`` time.
+"""
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import (pre_save, post_save, pre_delete,
+                                      post_delete, m2m_changed)
+from .models import Subject, Course, Module, Content, Text, Video, Image, File
+from .catalog import (bump_catalog_version, forget_course_slug,
+                      remember_course_slug)
+from .membership import invalidate_enrollments
+from .images import delete_variants, schedule_variants
+from .videos import schedule_metadata
+from .search import schedule_search_update
+from .versioning import COURSE, SUBJECT, bump, bump_contents
+
+ITEM_MODELS = (Text, Video, Image, File)
+
+
+def item_changed(sender, instance, **kwargs):
+    rows = Content.objects.filter(
+        content_type=ContentType.objects.get_for_model(sender),
+        object_id=instance.pk).values_list('module_id', 'module__course_id')
+    bump_contents(course_ids={course for _, course in rows},
+                  module_ids={module for module, _ in rows})
+
+
+def course_changed(sender, instance, **kwargs):
+    bump(COURSE, [instance.pk])
+
+
+def course_saved(sender, instance, **kwargs):
+    remember_course_slug(instance)
+
+
+def course_deleted(sender, instance, **kwargs):
+    forget_course_slug(instance)
+
+
+def module_changed(sender, instance, **kwargs):
+    bump_contents(course_ids=[instance.course_id], module_ids=[instance.pk])
+
+
+def subject_changed(sender, instance, **kwargs):
+    # course pages show the subject title
+    bump(SUBJECT, [instance.pk])
+    bump(COURSE, instance.courses.values_list('pk', flat=True))
+
+
+def content_changed(sender, instance, **kwargs):
+    course_ids = Module.objects.filter(
+        pk=instance.module_id).values_list('course_id', flat=True)
+    bump_contents(course_ids=course_ids, module_ids=[instance.module_id])
+
+
+def catalog_changed(sender, **kwargs):
+    bump_catalog_version()
+
+
+OWNER_NAME_FIELDS = ('first_name', 'last_name')
+
+
+def owner_pre_save(sender, instance, raw=False, update_fields=None,
+                   **kwargs):
+    # the catalog shows instructor names; ignore e.g. last_login updates
+    if (raw or instance.pk is None or update_fields is not None
+            and not set(OWNER_NAME_FIELDS) & set(update_fields)):
+        return
+    instance._owner_name = User.objects.filter(
+        pk=instance.pk).values_list(*OWNER_NAME_FIELDS).first()
+
+
+def owner_changed(sender, instance, created=False, **kwargs):
+    old_name = instance.__dict__.pop('_owner_name', None)
+    if created or old_name is None:
+        return
+    if old_name == tuple(getattr(instance, field)
+                         for field in OWNER_NAME_FIELDS):
+        return
+    course_ids = list(instance.courses_created.values_list('pk', flat=True))
+    if course_ids:
+        bump_catalog_version()
+        bump(COURSE, course_ids)
+
+
+def enrollments_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and not reverse:
+        # the students are unknown once the rows are gone
+        instance._cleared_students = list(
+            instance.students.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        invalidate_enrollments([instance.pk] if reverse else pk_set)
+    elif action == 'post_clear':
+        invalidate_enrollments([instance.pk] if reverse
+                               else instance.__dict__.pop('_cleared_students', []))
+
+
+def course_pre_delete(sender, instance, **kwargs):
+    invalidate_enrollments(list(instance.students.values_list('pk', flat=True)))
+
+
+def image_post_save(sender, instance, **kwargs):
+    schedule_variants(instance)
+
+
+def image_post_delete(sender, instance, **kwargs):
+    delete_variants(instance.file.storage, instance.variants)
+
+
+def video_post_save(sender, instance, **kwargs):
+    schedule_metadata(instance)
+
+
+def search_course_changed(sender, instance, **kwargs):
+    schedule_search_update([instance.pk])
+
+
+def search_module_changed(sender, instance, **kwargs):
+    schedule_search_update([instance.course_id])
+
+
+def search_content_changed(sender, instance, **kwargs):
+    if instance.content_type_id == ContentType.objects.get_for_model(Text).id:
+        schedule_search_update(Module.objects.filter(
+            pk=instance.module_id).values_list('course_id', flat=True))
+
+
+def search_text_changed(sender, instance, **kwargs):
+    schedule_search_update(Content.objects.filter(
+        content_type=ContentType.objects.get_for_model(Text),
+        object_id=instance.pk).values_list('module__course_id', flat=True))
+
+
+def connect():
+    for model in ITEM_MODELS:
+        name = model.__name__
+        post_save.connect(item_changed, sender=model,
+                          dispatch_uid=f'item_changed_save_{name}')
+        post_delete.connect(item_changed, sender=model,
+                            dispatch_uid=f'item_changed_delete_{name}')
+    for model, handler in ((Course, course_changed),
+                           (Module, module_changed),
+                           (Content, content_changed)):
+        name = model.__name__
+        post_save.connect(handler, sender=model,
+                          dispatch_uid=f'{name.lower()}_changed_save')
+        post_delete.connect(handler, sender=model,
+                            dispatch_uid=f'{name.lower()}_changed_delete')
+    for model in (Subject, Course, Module):
+        name = model.__name__
+        post_save.connect(catalog_changed, sender=model,
+                          dispatch_uid=f'catalog_changed_save_{name}')
+        post_delete.connect(catalog_changed, sender=model,
+                            dispatch_uid=f'catalog_changed_delete_{name}')
+    pre_save.connect(owner_pre_save, sender=User,
+                     dispatch_uid='catalog_owner_pre_save')
+    post_save.connect(owner_changed, sender=User,
+                      dispatch_uid='catalog_owner_changed')
+    m2m_changed.connect(enrollments_changed, sender=Course.students.through,
+                        dispatch_uid='enrollments_changed')
+    pre_delete.connect(course_pre_delete, sender=Course,
+                       dispatch_uid='enrollments_course_pre_delete')
+    post_save.connect(image_post_save, sender=Image,
+                      dispatch_uid='image_variants_save')
+    post_delete.connect(image_post_delete, sender=Image,
+                        dispatch_uid='image_variants_delete')
+    post_save.connect(video_post_save, sender=Video,
+                      dispatch_uid='video_metadata_save')
+    for model, handler in ((Course, search_course_changed),
+                           (Module, search_module_changed),
+                           (Content, search_content_changed),
+                           (Text, search_text_changed)):
+        name = model.__name__.lower()
+        post_save.connect(handler, sender=model,
+                          dispatch_uid=f'search_{name}_changed_save')
+        if model is not Course:
+            post_delete.connect(handler, sender=model,
+                                dispatch_uid=f'search_{name}_changed_delete')
+    post_save.connect(course_saved, sender=Course,
+                      dispatch_uid='course_slug_save')
+    post_delete.connect(course_deleted, sender=Course,
+                        dispatch_uid='course_slug_delete')
+    post_save.connect(subject_changed, sender=Subject,
+                      dispatch_uid='subject_changed_save')
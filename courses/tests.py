@@ -1,3 +1,467 @@
-from django.test import TestCase
+import base64
+import hashlib
+import json
+import shutil
+import tempfile
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from .archive import ArchiveError, export_courses, import_courses
+from .catalog import catalog_version
+from .models import Subject, Course, Module, Content, Text, Video, File, Upload
 
-# Create your tests here.
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CourseListViewQueriesTest(TestCase):
+    """
+    The catalog must run a constant number of queries,
+    whatever the number of courses listed.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.subject = Subject.objects.create(title='Maths', slug='maths')
+
+    def create_courses(self, count, start=0):
+        for i in range(start, start + count):
+            owner = User.objects.create(username=f'owner{i}',
+                                        first_name='Ada',
+                                        last_name=f'Lovelace {i}')
+            subject = Subject.objects.create(title=f'Subject {i}',
+                                             slug=f'subject-{i}')
+            course = Course.objects.create(owner=owner, subject=subject,
+                                           title=f'Course {i}',
+                                           slug=f'course-{i}',
+                                           overview='Overview')
+            Module.objects.create(course=course, title='Module')
+
+    def assertCatalogQueries(self, url):
+        # one query for the subjects and one for the courses
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        return response
+
+    def test_all_courses(self):
+        self.create_courses(1)
+        self.assertCatalogQueries(reverse('course_list'))
+        self.create_courses(5, start=1)
+        response = self.assertCatalogQueries(reverse('course_list'))
+        self.assertContains(response, 'Ada Lovelace 4')
+        self.assertContains(response, reverse('courses:course_list_subject',
+                                              args=['subject-4']))
+
+    def test_subject_courses(self):
+        self.create_courses(5)
+        self.assertCatalogQueries(reverse('courses:course_list_subject',
+                                          args=['subject-3']))
+
+    def test_empty_subject(self):
+        url = reverse('courses:course_list_subject', args=['maths'])
+        response = self.assertCatalogQueries(url)
+        self.assertContains(response, 'Maths courses')
+
+
+class CourseSearchTest(TestCase):
+    """
+    The search API matches courses by their title, overview,
+    modules and text contents.
+    """
+
+    def setUp(self):
+        owner = User.objects.create(username='owner')
+        subject = Subject.objects.create(title='Biology', slug='biology')
+        for i, overview in enumerate(['Cells', 'Plants', 'Animals']):
+            course = Course.objects.create(owner=owner, subject=subject,
+                                           title=f'Biology {i}',
+                                           slug=f'biology-{i}',
+                                           overview=overview)
+            module = Module.objects.create(course=course, title=f'Module {i}')
+        text = Text.objects.create(owner=owner, title='Notes',
+                                   content='Photosynthesis')
+        Content.objects.create(module=module, item=text)
+
+    def search(self, query):
+        response = self.client.get(reverse('courses_api:course_search'),
+                                   {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [course['slug'] for course in response.json()['results']]
+
+    def test_search(self):
+        self.assertEqual(self.search('plants'), ['biology-1'])
+        self.assertEqual(self.search('photosynthesis'), ['biology-2'])
+        self.assertEqual(len(self.search('biology')), 3)
+        self.assertEqual(self.search(''), [])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CourseDetailConditionalTest(TestCase):
+    """
+    Revalidating a course page must not serve a page whose
+    CSRF token is no longer valid.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='student',
+                                             password='secret')
+        subject = Subject.objects.create(title='Maths', slug='maths')
+        Course.objects.create(owner=self.user, subject=subject,
+                              title='Algebra', slug='algebra',
+                              overview='Overview')
+        self.url = reverse('courses:course_detail', args=['algebra'])
+
+    def test_revalidation(self):
+        self.client.login(username='student', password='secret')
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.client.logout()
+        self.client.login(username='student', password='secret')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_anonymous(self):
+        response = self.client.get(self.url)
+        self.assertIn('public', response['Cache-Control'])
+        response = self.client.get(self.url,
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+class CourseArchiveTest(TestCase):
+    """
+    Course archives import back into the same tree, and invalid
+    archives are rejected as a whole.
+    """
+
+    def setUp(self):
+        self.owner = User.objects.create(username='owner')
+        self.subject = Subject.objects.create(title='Maths', slug='maths')
+        for i in range(3):
+            course = Course.objects.create(owner=self.owner,
+                                           subject=self.subject,
+                                           title=f'Course {i}',
+                                           slug=f'course-{i}',
+                                           overview='Overview')
+            for j in range(2):
+                module = Module.objects.create(course=course,
+                                               title=f'Module {j}')
+                text = Text.objects.create(owner=self.owner, title='Notes',
+                                           content=f'Text {i}.{j}')
+                video = Video.objects.create(
+                    owner=self.owner, title='Video',
+                    url='https://www.youtube.com/watch?v=abcdefghijk')
+                Content.objects.create(module=module, item=text)
+                Content.objects.create(module=module, item=video)
+
+    def tree(self):
+        return [(course.slug, [(module.title, module.order,
+                                [(content.order, str(content.item))
+                                 for content in module.contents.all()])
+                               for module in course.modules.all()])
+                for course in Course.objects.order_by('slug')]
+
+    def test_round_trip(self):
+        before = self.tree()
+        lines = list(export_courses(Course.objects.all()))
+        Course.objects.all().delete()
+        stats = import_courses(lines, batch_size=2)
+        self.assertEqual(stats['courses'], 3)
+        self.assertEqual(stats['contents'], 12)
+        self.assertEqual(self.tree(), before)
+        # importing again skips the existing courses
+        self.assertEqual(import_courses(lines)['skipped'], 3)
+
+    def test_invalid_archive_is_rolled_back(self):
+        lines = list(export_courses(Course.objects.all()))
+        Course.objects.all().delete()
+        lines.append(json.dumps({'type': 'module', 'course': 'unknown',
+                                 'key': 1, 'title': 'Module',
+                                 'description': ''}))
+        with self.assertRaisesMessage(ArchiveError,
+                                      f'Line {len(lines)}: Unknown course'):
+            import_courses(lines, batch_size=1)
+        self.assertFalse(Course.objects.exists())
+
+    def test_malformed_records(self):
+        admin = User.objects.create_superuser(username='admin',
+                                              password='secret')
+        self.client.force_login(admin)
+        url = reverse('courses_api:course-import-archive')
+        for body in ['{"type": "course", "slug": "x"}',
+                     '{"type": "content", "module": 1}',
+                     '[1, 2]',
+                     '']:
+            response = self.client.post(url, body,
+                                        content_type='application/jsonl')
+            self.assertEqual(response.status_code, 400, body)
+            self.assertIn('error', response.json())
+
+
+class ChunkedUploadTest(TestCase):
+    """
+    Files are uploaded chunk by chunk, and chunks that don't start
+    at the upload's offset are refused.
+    """
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        patcher = mock.patch('courses.uploads.TEMP_DIR',
+                             f'{self.media_root}/uploads')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        User.objects.create_superuser(username='admin', password='secret')
+        credentials = base64.b64encode(b'admin:secret').decode()
+        self.auth = {'HTTP_AUTHORIZATION': f'Basic {credentials}'}
+
+    def put_chunk(self, url, data, first, size, length=None):
+        last = first + (length or len(data)) - 1
+        return self.client.put(
+            url, data, content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {first}-{last}/{size}', **self.auth)
+
+    def test_upload(self):
+        data = b'0123456789' * 10
+        response = self.client.post(reverse('courses_api:upload'), {
+            'model': 'file', 'filename': 'notes.txt', 'size': len(data),
+            'sha256': hashlib.sha256(data).hexdigest()}, **self.auth)
+        self.assertEqual(response.status_code, 201)
+        pk = response.json()['id']
+        url = reverse('courses_api:upload_detail', args=[pk])
+
+        response = self.put_chunk(url, data[:60], 0, len(data))
+        self.assertEqual(response.json()['offset'], 60)
+        # a retried chunk is refused with the current offset
+        response = self.put_chunk(url, data[:60], 0, len(data))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 60)
+        # as is a chunk without a body
+        response = self.put_chunk(url, b'', 60, len(data), length=40)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'The chunk is empty.')
+        # as is a range ending before it starts
+        response = self.put_chunk(url, data[60:], 60, len(data), length=-1)
+        self.assertEqual(response.status_code, 400)
+        response = self.put_chunk(url, data[60:], 60, len(data))
+        self.assertEqual(response.json()['offset'], len(data))
+
+        with self.settings(MEDIA_ROOT=self.media_root):
+            response = self.client.post(
+                reverse('courses_api:upload_complete', args=[pk]),
+                {'title': 'Notes'}, **self.auth)
+            self.assertEqual(response.status_code, 201)
+            item = File.objects.get(pk=response.json()['id'])
+            with item.file.open('rb') as f:
+                self.assertEqual(f.read(), data)
+        self.assertFalse(Upload.objects.exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ModuleOrderTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner',
+                                              password='secret')
+        subject = Subject.objects.create(title='Maths', slug='maths')
+        course = Course.objects.create(owner=self.owner, subject=subject,
+                                       title='Algebra', slug='algebra',
+                                       overview='Overview')
+        self.modules = [Module.objects.create(course=course,
+                                              title=f'Module {i}')
+                        for i in range(3)]
+        self.client.force_login(self.owner)
+
+    def post(self, positions):
+        return self.client.post(reverse('courses:module_order'), json.dumps(positions),
+                                content_type='application/json')
+
+    def test_reorder(self):
+        first, second, third = self.modules
+        response = self.post({third.id: 0, first.id: 1, second.id: 2})
+        self.assertEqual(response.json()['order'],
+                         [third.id, first.id, second.id])
+
+    def test_negative_order(self):
+        response = self.post({self.modules[0].id: -1})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.modules[0].order,
+                         Module.objects.get(pk=self.modules[0].pk).order)
+
+    def test_reorder_revalidates_api_list(self):
+        first, second, third = self.modules
+        url = reverse('courses_api:course-list')
+        etag = self.client.get(url)['ETag']
+        self.post({third.id: 0, first.id: 1, second.id: 2})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        modules = response.json()['results'][0]['modules']
+        self.assertEqual([module['title'] for module in modules],
+                         ['Module 2', 'Module 0', 'Module 1'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class OwnerNameTest(TestCase):
+    """
+    Only renaming an instructor moves the catalog version.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner')
+        subject = Subject.objects.create(title='Maths', slug='maths')
+        Course.objects.create(owner=self.owner, subject=subject,
+                              title='Algebra', slug='algebra',
+                              overview='Overview')
+
+    def test_other_users(self):
+        version = catalog_version()
+        user = User.objects.create_user(username='student', password='a')
+        user.set_password('secret')
+        user.first_name = 'Ada'
+        user.save()
+        self.owner.set_password('secret')
+        self.owner.save()
+        self.assertEqual(catalog_version(), version)
+
+    def test_rename(self):
+        version = catalog_version()
+        self.owner.first_name = 'Ada'
+        self.owner.save(update_fields=['first_name'])
+        self.assertNotEqual(catalog_version(), version)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ContentFileTest(TestCase):
+    """
+    Files are served to their owner and to the students of their
+    courses, with single-range requests.
+    """
+    data = bytes(range(100))
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = self.settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.owner = User.objects.create(username='owner')
+        student = User.objects.create(username='student')
+        User.objects.create(username='stranger')
+        subject = Subject.objects.create(title='Maths', slug='maths')
+        course = Course.objects.create(owner=self.owner, subject=subject,
+                                       title='Algebra', slug='algebra',
+                                       overview='Overview')
+        course.students.add(student)
+        module = Module.objects.create(course=course, title='Module')
+        self.item = File.objects.create(
+            owner=self.owner, title='Notes',
+            file=ContentFile(self.data, name='notes.bin'))
+        Content.objects.create(module=module, item=self.item)
+        self.url = reverse('courses:content_file',
+                           args=['file', self.item.id])
+
+    def get(self, username='student', **headers):
+        self.client.force_login(User.objects.get(username=username))
+        return self.client.get(self.url, headers=headers)
+
+    def content(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_access(self):
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+        for username in ('owner', 'student'):
+            response = self.get(username)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.content(response), self.data)
+        self.assertEqual(self.get('stranger').status_code, 403)
+
+    def test_ranges(self):
+        response = self.get(range='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/100')
+        self.assertEqual(self.content(response), self.data[10:20])
+        # the last 10 bytes
+        response = self.get(range='bytes=-10')
+        self.assertEqual(response['Content-Range'], 'bytes 90-99/100')
+        self.assertEqual(self.content(response), self.data[90:])
+        response = self.get(range='bytes=100-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */100')
+
+    def test_validators(self):
+        etag = self.get()['ETag']
+        response = self.get(range='bytes=10-19', if_range=etag)
+        self.assertEqual(response.status_code, 206)
+        # the range was for another version: send the whole file
+        response = self.get(range='bytes=10-19', if_range='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.content(response), self.data)
+        self.assertEqual(self.get(if_none_match=etag).status_code, 304)
+
+
+class OrderFieldTest(TestCase):
+    """
+    New objects are numbered after the last one of their parent.
+    """
+
+    def setUp(self):
+        owner = User.objects.create(username='owner')
+        subject = Subject.objects.create(title='Maths', slug='maths')
+        self.algebra, self.geometry = [
+            Course.objects.create(owner=owner, subject=subject, title=slug,
+                                  slug=slug, overview='Overview')
+            for slug in ('algebra', 'geometry')]
+        for title in ('Groups', 'Rings'):
+            Module.objects.create(course=self.algebra, title=title)
+
+    def test_allocate(self):
+        modules = [Module(course=self.algebra, title='Fields'),
+                   Module(course=self.geometry, title='Lines'),
+                   Module(course=self.algebra, title='Ideals', order=10),
+                   Module(course=self.algebra, title='Vectors'),
+                   Module(course=self.geometry, title='Circles')]
+        # one lock of the parents and one query for their last values
+        with self.assertNumQueries(2):
+            Module._meta.get_field('order').allocate(modules)
+        self.assertEqual([module.order for module in modules],
+                         [2, 0, 10, 3, 1])
+        Module.objects.bulk_create(modules)
+        module = Module.objects.create(course=self.algebra, title='Modules')
+        self.assertEqual(module.order, 11)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CourseApiFieldsTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create(username='owner')
+        subject = Subject.objects.create(title='Maths', slug='maths')
+        Course.objects.create(owner=owner, subject=subject, title='Algebra',
+                              slug='algebra', overview='Overview')
+        self.url = reverse('courses_api:course-list')
+
+    def test_sparse_fieldset(self):
+        response = self.client.get(self.url, {'fields': 'id,title'})
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'title'})
+
+    def test_unknown_fields(self):
+        response = self.client.get(self.url, {'fields': 'id,name,tags'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(),
+                         {'fields': 'Unknown fields: name, tags.'})
@@ -0,0 +1,176 @@
+"""
+Chunked, resumable uploads of the files of File and Image items.
+
+An upload is started with the file's name, size and SHA-256 digest.
+Its chunks are then sent in order, each written in place at its offset
+into a temporary file preallocated to the full size, so request memory
+stays flat and nothing is copied. After a disconnect the client asks
+for the upload's ``offset`` and resumes from there. Once every byte is
+in, the digest is checked and the temporary file is renamed into the
+storage as the file of a new item.
+
+Settings:
+
+* ``UPLOAD_CHUNK_SIZE``: the largest chunk accepted, in bytes.
+* ``UPLOAD_MAX_SIZE``: the largest file accepted, in bytes.
+* ``UPLOAD_TEMP_DIR``: where files are assembled; it must be on the
+  same filesystem as ``MEDIA_ROOT`` for the final rename to be free.
+"""
+import hashlib
+import os
+import re
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File as DjangoFile
+from django.db import transaction
+from django.utils import timezone
+from .models import Content, Upload
+
+CHUNK_SIZE = getattr(settings, 'UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)
+MAX_SIZE = getattr(settings, 'UPLOAD_MAX_SIZE', 4 * 1024 * 1024 * 1024)
+TEMP_DIR = getattr(settings, 'UPLOAD_TEMP_DIR',
+                   os.path.join(settings.MEDIA_ROOT, 'uploads'))
+READ_SIZE = 64 * 1024
+
+sha256_re = re.compile(r'^[0-9a-f]{64}$')
+
+
+class UploadError(Exception):
+    """
+    Raised when an upload request can't be honoured.
+    """
+
+
+class OffsetMismatch(UploadError):
+    """
+    Raised when a chunk doesn't start where the upload stands.
+    """
+
+
+def part_path(upload):
+    return os.path.join(TEMP_DIR, f'{upload.pk}.part')
+
+
+def start_upload(owner, model_name, filename, size, sha256):
+    """
+    Create the upload and preallocate its temporary file.
+    """
+    if size > MAX_SIZE:
+        raise UploadError(f'Files are limited to {MAX_SIZE} bytes.')
+    sha256 = sha256.lower()
+    if not sha256_re.match(sha256):
+        raise UploadError('Expected a SHA-256 hex digest.')
+    upload = Upload.objects.create(owner=owner, model=model_name,
+                                   filename=os.path.basename(filename),
+                                   size=size, sha256=sha256)
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    with open(part_path(upload), 'wb') as f:
+        f.truncate(size)
+    return upload
+
+
+def write_chunk(upload, offset, length, stream):
+    """
+    Write ``length`` bytes read from ``stream`` at ``offset`` and
+    return the new offset of the upload. A chunk cut short by a
+    disconnect still counts for what was received. ``stream`` is None
+    for requests without a body.
+    """
+    if offset != upload.offset:
+        raise OffsetMismatch(f'Expected offset {upload.offset}.')
+    if length > CHUNK_SIZE:
+        raise UploadError(f'Chunks are limited to {CHUNK_SIZE} bytes.')
+    if offset + length > upload.size:
+        raise UploadError('The chunk ends past the end of the file.')
+    if stream is None:
+        raise UploadError('The chunk is empty.')
+    written = 0
+    with open(part_path(upload), 'r+b') as f:
+        f.seek(offset)
+        while written < length:
+            data = stream.read(min(READ_SIZE, length - written))
+            if not data:
+                break
+            f.write(data)
+            written += len(data)
+    # another request may have written this chunk meanwhile
+    if not Upload.objects.filter(pk=upload.pk, offset=offset).update(
+            offset=offset + written, updated=timezone.now()):
+        upload.refresh_from_db(fields=['offset'])
+        raise OffsetMismatch(f'Expected offset {upload.offset}.')
+    upload.offset = offset + written
+    return upload.offset
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for data in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def _store(path, field, instance, filename):
+    """
+    Move the assembled file into the field's storage and return its
+    storage name; local storages get a rename, others a copy.
+    """
+    storage = field.storage
+    name = field.generate_filename(instance, filename)
+    try:
+        storage.path(name)
+    except NotImplementedError:
+        with open(path, 'rb') as f:
+            name = storage.save(name, DjangoFile(f))
+        os.remove(path)
+        return name
+    name = storage.get_available_name(name)
+    target = storage.path(name)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(path, target)
+    return name
+
+
+def complete_upload(upload, title, module=None):
+    """
+    Check the digest of the complete file and turn it into a new item,
+    appended to ``module`` if given. Return the item.
+    """
+    if upload.offset != upload.size:
+        raise UploadError(f'{upload.size - upload.offset} bytes missing.')
+    path = part_path(upload)
+    if file_digest(path) != upload.sha256:
+        # the bytes on disk can't be trusted; start over
+        discard_upload(upload)
+        raise UploadError('Checksum mismatch; the upload was discarded.')
+    model = apps.get_model('courses', upload.model)
+    item = model(owner=upload.owner, title=title)
+    with transaction.atomic():
+        item.file.name = _store(path, model._meta.get_field('file'),
+                                item, upload.filename)
+        item.save()
+        if module is not None:
+            Content.objects.create(module=module, item=item)
+        upload.delete()
+    return item
+
+
+def discard_upload(upload):
+    try:
+        os.remove(part_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+
+def clear_stale_uploads(age):
+    """
+    Discard the uploads that have not progressed for ``age``
+    and return how many there were.
+    """
+    stale = Upload.objects.filter(updated__lt=timezone.now() - age)
+    count = 0
+    for upload in stale.iterator():
+        discard_upload(upload)
+        count += 1
+    return count
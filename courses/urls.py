@@ -26,12 +26,15 @@ urlpatterns = [
     path('content/<int:id>/delete/',
          views.ContentDeleteView.as_view(),
          name='module_content_delete'),
+    path('content/<model_name>/<int:id>/download/',
+         views.ContentFileView.as_view(),
+         name='content_file'),
     path('module/<int:module_id>/',
          views.ModuleContentViewList.as_view(),
          name='module_content_list'),
     path('module/order/', views.ModuleOrderView.as_view(),
          name='module_order'),
-    path('content/order/', views.ModuleOrderView.as_view(),
+    path('content/order/', views.ContentOrderView.as_view(),
          name='content_order'),
     path('subject/<slug:subject>/', views.CourseListView.as_view(),
          name='course_list_subject'),
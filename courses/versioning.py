@@ -0,0 +1,92 @@
+"""
+Version numbers of subjects, courses and modules, and of the catalog.
+
+Cache keys embed the version of what they were built from: catalog
+rows, course payloads, module fragments. Signals bump the versions on
+writes with one ``INCR`` each, so nothing has to be deleted and stale
+entries simply expire. Each bump also records when the object last
+changed, for ``Last-Modified`` headers.
+
+Versions live in the default cache, Redis in production, where ``INCR``
+is atomic. A version missing from the cache is reseeded from the clock
+in milliseconds, above any value increments could have reached, so old
+keys are never reused.
+"""
+import time
+from django.core.cache import cache
+
+# longer than anything cached under a version
+VERSION_TIMEOUT = 60 * 60 * 24 * 30
+
+# kinds of versioned objects; the catalog has the single id 0
+SUBJECT = 'subject'
+COURSE = 'course'
+MODULE = 'module'
+CATALOG = 'catalog'
+
+
+def version_key(kind, pk=0):
+    return f'version:{kind}:{pk}'
+
+
+def changed_key(kind, pk=0):
+    return f'changed:{kind}:{pk}'
+
+
+def _seed():
+    return time.time_ns() // 1_000_000
+
+
+def get_versions(kind, pks):
+    """
+    Return a dict mapping each of ``pks`` to its current version,
+    with a single cache lookup once the versions exist.
+    """
+    keys = {version_key(kind, pk): pk for pk in pks}
+    found = cache.get_many(list(keys))
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            cache.add(key, _seed(), VERSION_TIMEOUT)
+        found.update(cache.get_many(missing))
+    return {pk: found[key] for key, pk in keys.items()}
+
+
+def get_version(kind, pk=0):
+    return get_versions(kind, [pk])[pk]
+
+
+def bump(kind, pks=(0,)):
+    """
+    Move the versions of the given objects forward.
+    """
+    for pk in set(pks):
+        key = version_key(kind, pk)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _seed(), VERSION_TIMEOUT)
+    now = time.time()
+    cache.set_many({changed_key(kind, pk): now for pk in pks},
+                   VERSION_TIMEOUT)
+
+
+def bump_contents(course_ids=(), module_ids=()):
+    """
+    Bump the given modules and courses after their contents changed.
+    """
+    bump(MODULE, module_ids)
+    bump(COURSE, course_ids)
+
+
+def last_changed(kind, pk=0):
+    """
+    Return when the object last changed, as a POSIX timestamp;
+    unknown objects are taken to have changed now.
+    """
+    key = changed_key(kind, pk)
+    changed = cache.get(key)
+    if changed is None:
+        cache.add(key, time.time(), VERSION_TIMEOUT)
+        changed = cache.get(key)
+    return changed
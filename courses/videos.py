@@ -0,0 +1,109 @@
+"""
+Provider metadata of Video items.
+
+The provider, video id, thumbnail URL, duration and embed HTML of a
+video are resolved once, off the request path, after the video is
+saved, and stored in ``Video.metadata`` along with the ``source`` URL
+they describe. Templates render the stored embed HTML, so a module
+full of videos never waits on a provider. The ``refresh_video_metadata``
+command resolves them again in bulk.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from embed_video.backends import EmbedVideoException, detect_backend
+from embed_video.templatetags.embed_video_tags import VideoNode
+import requests
+from .models import Content, Video
+from .versioning import bump_contents
+
+logger = logging.getLogger(__name__)
+
+EMBED_SIZE = getattr(settings, 'VIDEO_EMBED_SIZE', 'small')
+
+executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'VIDEO_METADATA_WORKERS', 2),
+    thread_name_prefix='video-metadata')
+
+
+def fetch_metadata(url):
+    """
+    Ask the provider about the video at ``url``. Videos that can't be
+    resolved get metadata without ``embed_html``.
+    """
+    metadata = {'source': url, 'fetched': timezone.now().isoformat()}
+    try:
+        backend = detect_backend(url)
+        backend.is_secure = True
+        width, height = VideoNode.get_size(EMBED_SIZE)
+        metadata.update({
+            'provider': backend.backend.removesuffix('Backend').lower(),
+            'video_id': backend.code,
+            'embed_html': backend.get_embed_code(width=width, height=height),
+        })
+    except (EmbedVideoException, requests.RequestException) as e:
+        logger.warning('Could not resolve video %s: %r', url, e)
+        metadata['error'] = str(e) or e.__class__.__name__
+        return metadata
+    try:
+        metadata['thumbnail_url'] = backend.thumbnail
+        # only some providers report it, and only through their API
+        if backend.backend == 'VimeoBackend':
+            metadata['duration'] = backend.info.get('duration')
+    except (EmbedVideoException, requests.RequestException) as e:
+        # the video can still be embedded; try again on the next refresh
+        logger.warning('Could not fetch details of video %s: %r', url, e)
+        metadata['error'] = str(e) or e.__class__.__name__
+    return metadata
+
+
+def store_metadata(videos):
+    """
+    Save the ``metadata`` of the given videos, unless their URL changed
+    meanwhile. Bumping ``updated`` moves their render cache keys.
+    """
+    stored = []
+    now = timezone.now()
+    for video in videos:
+        if Video.objects.filter(pk=video.pk, url=video.metadata['source']) \
+                .update(metadata=video.metadata, updated=now):
+            stored.append(video)
+    if not stored:
+        return stored
+    rows = Content.objects.filter(
+        content_type=ContentType.objects.get_for_model(Video),
+        object_id__in=[video.pk for video in stored]
+    ).values_list('module_id', 'module__course_id')
+    bump_contents(course_ids={course for _, course in rows},
+                  module_ids={module for module, _ in rows})
+    return stored
+
+
+def resolve_metadata(video_id):
+    """
+    Resolve and store the metadata of a video; runs in the worker pool.
+    """
+    close_old_connections()
+    try:
+        video = Video.objects.get(pk=video_id)
+        video.metadata = fetch_metadata(video.url)
+        store_metadata([video])
+    except Video.DoesNotExist:
+        pass
+    except Exception:
+        logger.exception('Could not store metadata of video %s', video_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_metadata(video):
+    """
+    Resolve the metadata of the video after the current transaction
+    commits, unless it describes the current URL.
+    """
+    if video.metadata.get('source') != video.url:
+        transaction.on_commit(
+            lambda: executor.submit(resolve_metadata, video.pk))
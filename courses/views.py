@@ -1,3 +1,4 @@
+from django.http import Http404, HttpResponseForbidden
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.generic.base import TemplateResponseMixin, View
 from django.views.generic.list import ListView
@@ -7,11 +8,21 @@ from django.urls import reverse_lazy
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.forms.models import modelform_factory
 from django.apps import apps
-from django.db.models import Count
+from django.db import transaction
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.fields.files import FieldFile
+from django.utils.cache import get_conditional_response
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from braces.views import CsrfExemptMixin, JsonRequestResponseMixin
-from django.core.cache import cache
-from .models import Course, Module, Content, Subject
+from .models import Course, Module, Content
 from .forms import ModuleFormSet
+from . import catalog
+from .loaders import prefetch_module_contents
+from .membership import enrolled_course_ids
+from .downloads import file_response
+from .conditional import cache_for_anonymous, catalog_etag, course_page_etag
+from .versioning import bump_contents
 from students.forms import CourseEnrollForm
 
 
@@ -109,7 +120,9 @@ class CourseModuleUpdateView(TemplateResponseMixin, View):
     def post(self, request, *args, **kwargs):
         formset = self.get_formset(data=request.POST)
         if formset.is_valid():
-            formset.save()
+            # new modules lock the course while their order is allocated
+            with transaction.atomic():
+                formset.save()
             return redirect('courses:manage_course_list')
         return self.render_to_response({
             'course': self.course,
@@ -182,13 +195,15 @@ class ContentCreateUpdateView(TemplateResponseMixin, View):
                              files=request.FILES)
 
         if form.is_valid():
-            obj =form.save(commit=False)
-            obj.owner = request.user
-            obj.save()
-            if not id:
-                # new content
-                Content.objects.create(module=self.module,
-                                       item=obj)
+            with transaction.atomic():
+                obj = form.save(commit=False)
+                obj.owner = request.user
+                obj.save()
+                if not id:
+                    # new content, its order is allocated under a lock
+                    # on the module
+                    Content.objects.create(module=self.module,
+                                           item=obj)
             return redirect('courses:module_content_list',
                             self.module.id)
         return self.render_to_response({'form': form,
@@ -205,61 +220,139 @@ class ContentDeleteView(View):
         return redirect('courses:module_content_list', module.id)
 
 
+class ContentFileView(LoginRequiredMixin, View):
+    """
+    Serves the file of a File or Image item to its owner and to
+    the students of a course containing it.
+    """
+
+    def get(self, request, model_name, id):
+        if model_name not in ['file', 'image']:
+            raise Http404
+        model = apps.get_model(app_label='courses', model_name=model_name)
+        item = get_object_or_404(model, id=id)
+        if item.owner_id != request.user.id:
+            course_ids = Content.objects.filter(
+                content_type=ContentType.objects.get_for_model(model),
+                object_id=item.id).values_list('module__course_id', flat=True)
+            if not enrolled_course_ids(request.user).intersection(course_ids):
+                return HttpResponseForbidden()
+        field_file = item.file
+        width = request.GET.get('w')
+        if width:
+            # a resized variant of an image
+            name = getattr(item, 'variants', {}).get('widths', {}).get(width)
+            if name is None:
+                raise Http404
+            field_file = FieldFile(item, model._meta.get_field('file'), name)
+        etag = (f'"{model_name}-{item.id}-{width or 0}-'
+                f'{item.updated.timestamp()}"')
+        response = get_conditional_response(
+            request, etag=etag,
+            last_modified=int(item.updated.timestamp()))
+        if response is not None:
+            return response
+        return file_response(request, field_file, etag, item.updated)
+
+
 class ModuleContentViewList(TemplateResponseMixin, View):
     template_name = 'courses/manage/module/content_list.html'
 
     def get(self, request, module_id):
-        module = get_object_or_404(Module, id=module_id,
+        module = get_object_or_404(Module.objects.select_related('course'),
+                                   id=module_id,
                                    course__owner=request.user)
+        prefetch_module_contents(module)
         return self.render_to_response({'module': module})
 
 
-class ModuleOrderView(CsrfExemptMixin,
-                      JsonRequestResponseMixin,
-                      View):
-
-    def post(self, request):
-        for id, order in self.request_json.items():
-            Module.objects.filter(id=id,
-                                  course__owner=request.user).update(order=order)
-        return self.render_json_response({'saved': 'OK'})
+class OrderView(CsrfExemptMixin,
+                JsonRequestResponseMixin,
+                View):
+    """
+    Applies a ``{id: order}`` JSON mapping in one statement.
+    Ownership is checked once for all the ids; the response
+    holds the final ordering of the reordered objects' parents.
+    """
+    model = None
+    parent_field = None
+    owner_lookup = None
 
+    def get_queryset(self):
+        return self.model.objects.filter(
+            **{self.owner_lookup: self.request.user})
 
-class ContentOrderView(CsrfExemptMixin,
-                       JsonRequestResponseMixin,
-                       View):
+    def invalidate(self, objects):
+        pass
 
     def post(self, request):
-        for id, order in self.request_json.items():
-            Content.objects.filter(id=id,
-                                   module__course__owner=request.user).update(order=order)
-        return self.render_json_response({'saved': 'OK'})
+        try:
+            positions = {int(id): int(order)
+                         for id, order in self.request_json.items()}
+        except (AttributeError, TypeError, ValueError):
+            return self.render_bad_request_response(
+                {'error': 'Expected a JSON object of {id: order}.'})
+        if any(order < 0 for order in positions.values()):
+            return self.render_bad_request_response(
+                {'error': 'Orders must not be negative.'})
+        with transaction.atomic():
+            objects = list(self.get_queryset().filter(id__in=positions)
+                           .only('id', self.parent_field))
+            if len(objects) != len(positions):
+                return self.render_json_response(
+                    {'error': 'Unknown or forbidden ids.'}, status=403)
+            for obj in objects:
+                obj.order = positions[obj.id]
+            self.model.objects.bulk_update(objects, ['order'],
+                                           batch_size=1000)
+        self.invalidate(objects)
+        parents = {getattr(obj, self.parent_field) for obj in objects}
+        order = self.model.objects.filter(
+            **{f'{self.parent_field}__in': parents}
+        ).order_by('order', 'id').values_list('id', flat=True)
+        return self.render_json_response({'saved': 'OK',
+                                          'order': list(order)})
+
+
+class ModuleOrderView(OrderView):
+    model = Module
+    parent_field = 'course_id'
+    owner_lookup = 'course__owner'
+
+    def invalidate(self, objects):
+        bump_contents(course_ids={module.course_id for module in objects})
+        # the courses API list nests the modules in their order
+        catalog.bump_catalog_version()
+
+
+class ContentOrderView(OrderView):
+    model = Content
+    parent_field = 'module_id'
+    owner_lookup = 'module__course__owner'
+
+    def invalidate(self, objects):
+        module_ids = {content.module_id for content in objects}
+        bump_contents(
+            course_ids=set(Module.objects.filter(id__in=module_ids)
+                           .values_list('course_id', flat=True)),
+            module_ids=module_ids)
 
 
 class CourseListView(TemplateResponseMixin, View):
     model = Course
     template_name = 'courses/course/list.html'
 
+    @method_decorator(cache_for_anonymous)
+    @method_decorator(condition(etag_func=catalog_etag))
     def get(self, request, subject=None):
-        subjects = cache.get('all_subjects')
-        if not subjects:
-            subjects = Subject.objects.annotate(
-                total_courses=Count('courses'))
-            cache.set('all_subjects', subjects)
-        all_courses = Course.objects.annotate(
-            total_modules=Count('modules'))
+        subjects = catalog.get_subjects()
         if subject:
-            subject = get_object_or_404(Subject, slug=subject)
-            key = f'subject_{subject.id}_courses'
-            courses = cache.get(key)
-            if not courses:
-                courses = all_courses.filter(subject=subject)
-                cache.set(key, courses)
+            subject = catalog.get_subject(subject)
+            if subject is None:
+                raise Http404('No subject matches the given query.')
+            courses = catalog.get_courses(subject.id)
         else:
-            courses = cache.get('all_courses')
-            if not courses:
-                courses = all_courses
-                cache.set('all_courses', courses)
+            courses = catalog.get_courses()
         return self.render_to_response({'subjects': subjects,
                                         'subject': subject,
                                         'courses': courses})
@@ -269,6 +362,11 @@ class CourseDetailView(DetailView):
     model = Course
     template_name = 'courses/course/detail.html'
 
+    @method_decorator(cache_for_anonymous)
+    @method_decorator(condition(etag_func=course_page_etag))
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['enroll_form'] = CourseEnrollForm(
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'students.apps.StudentsConfig',
     'embed_video',
     'debug_toolbar',
@@ -152,6 +153,11 @@ STATICFILES_DIRS = [
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Course files are served by courses.views.ContentFileView; in production
+# let the web server send them: 'x-accel' (nginx) or 'x-sendfile' (Apache)
+COURSE_FILES_OFFLOAD = os.getenv('COURSE_FILES_OFFLOAD') or None
+COURSE_FILES_ACCEL_PREFIX = '/protected-media/'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -188,12 +194,26 @@ REST_FRAMEWORK = {
 
 ASGI_APPLICATION = 'dzidzai.asgi.application'
 
-# Redis channel layer
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels_redis.core.RedisChannelLayer',
-        'CONFIG': {
-            'hosts': [('127.0.0.1', 6379)],
+# Channel layer: 'redis' for production, 'memory' for tests and
+# benchmarks that run without a Redis server
+CHANNEL_LAYER_MODE = os.getenv('CHANNEL_LAYER_MODE', 'redis')
+
+if CHANNEL_LAYER_MODE == 'memory':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
         },
-    },
-}
+    }
+    # chat history and presence are stored in Redis
+    CHAT_PERSIST = False
+    CHAT_TRACK_PRESENCE = False
+else:
+    # Redis channel layer
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': [('127.0.0.1', 6379)],
+            },
+        },
+    }
@@ -1,5 +1,4 @@
 from django.urls import path
-from django.views.decorators.cache import cache_page
 from . import views
 
 app_name = 'students'
@@ -11,10 +10,8 @@ urlpatterns = [
          name='student_enroll_course'),
     path('courses/', views.StudentCourseListView.as_view(),
          name='student_course_list'),
-    path('course/<pk>/',
-         cache_page(60 * 15)(views.StudentCourseDetailView.as_view()),
+    path('course/<pk>/', views.StudentCourseDetailView.as_view(),
          name='student_course_detail'),
-    path('course/<pk>/<module_id>/',
-         cache_page(60 * 15)(views.StudentCourseDetailView.as_view()),
+    path('course/<pk>/<module_id>/', views.StudentCourseDetailView.as_view(),
          name='student_course_detail_module'),
 ]
@@ -5,8 +5,14 @@ from django.views.generic.detail import DetailView
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
 from .forms import CourseEnrollForm
 from courses.models import Course
+from courses.loaders import prefetch_module_contents
+from courses.rendering import render_module_items
+from courses.versioning import MODULE, get_version
+from courses.membership import enrolled_course_ids
 
 
 class StudentRegistrationView(CreateView):
@@ -43,7 +49,7 @@ class StudentCourseListView(LoginRequiredMixin, ListView):
 
     def get_queryset(self):
         qs = super().get_queryset()
-        return qs.filter(students__in=[self.request.user])
+        return qs.filter(id__in=enrolled_course_ids(self.request.user))
 
 
 class StudentCourseDetailView(DetailView):
@@ -52,17 +58,25 @@ class StudentCourseDetailView(DetailView):
 
     def get_queryset(self):
         qs = super().get_queryset()
-        return qs.filter(students__in=[self.request.user])
+        return qs.filter(id__in=enrolled_course_ids(self.request.user))
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         # get course object
-        course = self.get_object()
+        course = self.object
         if 'module_id' in self.kwargs:
             # get current module
-            context['module'] = course.modules.get(
-                id=self.kwargs['module_id'])
+            module = course.modules.get(id=self.kwargs['module_id'])
         else:
             # get first module
-            context['module'] = course.modules.all()[0]
+            module = course.modules.all()[0]
+        version = get_version(MODULE, module.id)
+        fragment_key = make_template_fragment_key('module_contents',
+                                                  [module.id, version])
+        if cache.get(fragment_key) is None:
+            # load all contents and their items in bulk
+            prefetch_module_contents(module)
+            render_module_items(module)
+        context['module'] = module
+        context['module_version'] = version
         return context
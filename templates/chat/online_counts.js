@@ -0,0 +1,10 @@
+// live number of students in each course chat room
+const onlineCounts = document.querySelectorAll('.online-count');
+if (onlineCounts.length) {
+    const ids = Array.from(onlineCounts, el => el.dataset.course);
+    fetch('{% url "chat:course_presence" %}?courses=' + ids.join(','))
+        .then(response => response.json())
+        .then(data => onlineCounts.forEach(function(el) {
+            el.textContent = (data.online[el.dataset.course] || 0) + ' online';
+        }));
+}